@@ -0,0 +1,124 @@
+"""
+Incremental dead-end analysis of game positions.
+
+After each move the position gets a status:
+    'won', 'no moves' (no legal move left), 'lost' (no reachable win),
+    'winnable' (a win was found) or 'unknown' (out of budget)
+Cheap checks come first, then results of the previous position are reused:
+successors of a lost position are lost, and a position along a known winning line
+is winnable. Then the shared solved-position cache, if any, answers known positions.
+Otherwise a search bounded by a time budget runs, and its results go to the cache.
+"""
+from collections import namedtuple
+from time import perf_counter
+import solver
+
+Analysis = namedtuple('Analysis', ['status', 'line', 'nodes', 'elapsed'])
+lost = ('no moves', 'lost')
+max_line = 512  # moves followed through the cache before giving up on a line
+
+
+def cached(cache, pos):
+    """
+    cache -> solvecache.SolvedCache
+    Return tuple(status, line) of a position known to cache: 'won' with the moves to win
+    or 'lost' with None ; None if unknown, or if the winning line was partly evicted
+    """
+    known = cache.get(pos)
+    if known is None:
+        return None
+    if not known.solvable:
+        return 'lost', None
+    line = []
+    while known is not None and known.move is not None and len(line) < max_line:
+        line.append(known.move)
+        pos = solver.apply(pos, known.move)
+        known = cache.get(pos)
+    return ('won', line) if solver.is_won(pos) else None
+
+
+def remember(cache, pos, status, line=None, proven=()):
+    """
+    Store search results to cache: every position along a winning line, with its
+    distance and first move, or proven -> keys of the positions proven lost
+    """
+    if status == 'won':
+        for k, move in enumerate(line):
+            cache.put(pos, True, len(line) - k, move)
+            pos = solver.apply(pos, move)
+        cache.put(pos, True)
+    elif status == 'lost':
+        cache.put_lost(proven)
+
+
+class Analyser(object):
+    """
+    budget -> seconds of search per position
+    rules -> solver.Rules to play by ; see variants
+    cache -> solvecache.SolvedCache shared across games, None to only search ; standard FreeCell only
+    """
+
+    def __init__(self, budget=0.003, max_dead=200000, rules=solver.standard, cache=None):
+        self.rules = rules
+        self.cache = cache
+        self.budget = budget
+        self.max_dead = max_dead
+        self.dead = set()  # keys of positions proven lost
+        self.winning = {}  # key -> remaining winning line
+        self.last = None  # tuple(key, Analysis)
+
+    def remember_line(self, pos, line):
+        """Know positions along winning line from position pos as winnable"""
+        for k, move in enumerate(line):
+            self.winning[solver.key(pos, self.rules)] = line[k:]
+            pos = solver.apply(pos, move)
+
+    def analyse(self, stacks, previous=None):
+        """
+        stacks -> position as 16 sequences of card ids
+        previous -> position the move was played from, to reuse its analysis
+        Return Analysis
+        """
+        start = perf_counter()
+        pos = solver.position(stacks)
+        key = solver.key(pos, self.rules)
+        status, line, nodes = self._cheap(pos, key, previous)
+        if status is None:
+            proven = []
+            status, line, nodes = solver.search(pos, deadline=start + self.budget, dead=self.dead, proven=proven,
+                                                rules=self.rules)
+            if self.cache is not None:
+                remember(self.cache, pos, status, line, proven)
+            if status == 'won':
+                status = 'winnable'
+                self.remember_line(pos, line)
+            if len(self.dead) > self.max_dead:
+                self.dead.clear()
+        if status in lost:
+            self.dead.add(key)
+        resp = Analysis(status, line, nodes, perf_counter() - start)
+        self.last = key, resp
+        return resp
+
+    def _cheap(self, pos, key, previous):
+        if solver.is_won(pos, self.rules):
+            return 'won', [], 0
+        if not solver.moves(pos, rules=self.rules):
+            return 'no moves', None, 0
+        if key in self.dead:
+            return 'lost', None, 0
+        if previous is not None and self.last is not None:
+            last_key, last = self.last
+            if last_key == solver.key(solver.position(previous), self.rules) and last.status in lost:
+                return 'lost', None, 0
+        line = self.winning.get(key)
+        if line is not None:
+            return 'winnable', line, 0
+        known = cached(self.cache, pos) if self.cache is not None else None
+        if known is not None:
+            status, line = known
+            if status == 'won':
+                self.remember_line(pos, line)
+                return 'winnable', line, 0
+            return 'lost', None, 0
+        return None, None, 0
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the blit pipeline: blits per second of raw surfaces
+versus surfaces converted to the display format (RLE for shade), slot render plus
+one blit per frame with an RLE versus a plain colorkey, and slot renders per second
+of long stacks, blitting every card versus visible strips.
+Runs headless with SDL_VIDEODRIVER=dummy.
+"""
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame  # noqa: E402
+from pygame.constants import RLEACCEL  # noqa: E402
+from time import perf_counter  # noqa: E402
+import deck  # noqa: E402
+from deck import Colors  # noqa: E402
+from board import TableauSlot  # noqa: E402
+
+screensize = (1280, 720)
+duration = 1.0  # seconds per measure
+
+
+def blits_per_second(screen, surfaces, area=None):
+    n = 0
+    start = perf_counter()
+    while perf_counter() - start < duration:
+        for srf in surfaces:
+            screen.blit(srf, (0, 0), area)
+        n += len(surfaces)
+    return n / (perf_counter() - start)
+
+
+def raw_copy(surface, depth=32):
+    """Surface copy in a format unrelated to the display, as before conversion"""
+    srf = pygame.Surface(surface.get_size(), 0, depth)
+    srf.blit(surface, (0, 0))
+    return srf
+
+
+def card_bench(screen):
+    cards = [c.render() for c in deck.deck]
+    raw = [raw_copy(c, depth=24) for c in cards]
+    return blits_per_second(screen, raw), blits_per_second(screen, cards)
+
+
+def rle_render(slot):
+    """Slot.render with an RLE colorkey, as before"""
+    surface = slot.render()
+    surface.set_colorkey(Colors.black, RLEACCEL)
+    return surface
+
+
+def frames_per_second(screen, render, slot):
+    """Slot renders then blitted once, as each frame does"""
+    n = 0
+    start = perf_counter()
+    while perf_counter() - start < duration:
+        screen.blit(render(slot), (0, 0), slot.area())
+        n += 1
+    return n / (perf_counter() - start)
+
+
+def colorkey_bench(screen, slot):
+    return frames_per_second(screen, rle_render, slot), frames_per_second(screen, TableauSlot.render, slot)
+
+
+def shade_bench(screen, slot):
+    size = slot.area().size
+    before = pygame.Surface(size=size, depth=24)
+    before.fill(Colors.blueish)
+    before.set_alpha(100)
+    after = deck.shade(size, Colors.blueish, 100)
+    return blits_per_second(screen, [before]), blits_per_second(screen, [after])
+
+
+def full_render(slot):
+    """Slot.render blitting every card whole, as before visible strips"""
+    w, h = slot.base_size
+    surface = deck.display_format(pygame.Surface(size=slot.area().size))
+    surface.fill(Colors.light_green, pygame.Rect(0, 0, w, h))
+    surface.set_colorkey(Colors.black)
+    for i, card in enumerate(slot):
+        surface.blit(card.render(), slot.get_position(i))
+    return surface
+
+
+def renders_per_second(render, slot):
+    n = 0
+    start = perf_counter()
+    while perf_counter() - start < duration:
+        render(slot)
+        n += 1
+    return n / (perf_counter() - start)
+
+
+def stack_bench(screen, length, spreadth=2.5):
+    slot = TableauSlot(spreadth=spreadth)
+    slot.stack.extend(deck.deck[k % 52] for k in range(length))
+    return renders_per_second(full_render, slot), renders_per_second(TableauSlot.render, slot)
+
+
+def main():
+    pygame.init()
+    try:
+        screen = pygame.display.set_mode(screensize)
+        deck.set_size(screensize, cols=8, rows=3.5, margin=5)
+        slot = TableauSlot()
+        slot.stack.extend(deck.deck[12::-1])  # full run K -> A
+        print(f'display depth={screen.get_bitsize()} card_size={deck.card_size}')
+        for name, unit, bench in [('card', 'blit', card_bench),
+                                  ('slot colorkey', 'frame', lambda s: colorkey_bench(s, slot)),
+                                  ('shade overlay', 'blit', lambda s: shade_bench(s, slot))]:
+            before, after = bench(screen)
+            print(f'{name:>14}: before {before:>10.0f} {unit}/s  after {after:>10.0f} {unit}/s  x{after / before:.2f}')
+        for length, spreadth in [(13, 2.5), (52, 2.5), (200, 2.5), (200, 8)]:
+            before, after = stack_bench(screen, length, spreadth)
+            print(f'{length:>4} cards x{spreadth:<3}: before {before:>8.0f} render/s  after {after:>8.0f} render/s  x{after / before:.2f}')
+    finally:
+        pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
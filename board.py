@@ -1,4 +1,5 @@
-from deck import card_size, Colors, Card
+import deck
+from deck import Colors, Card, display_format, shade
 import pygame
 from collections import deque
 from itertools import count
@@ -62,17 +63,21 @@ class Slot(object):
         return resp
 
     def receive_from(self, slot, max_cards):
+        """
+        Move as many cards as feasible, up to max_cards, from the top of slot
+        Return the number of cards moved
+        """
         # print(self.__class__.__name__, ': receive max ', max_cards)
-        for k in range(max_cards, 0, -1):
+        for k in range(min(max_cards, len(slot)), 0, -1):
             try:
                 self.put(slot[-k:])
             except ValueError:
                 continue
             else:
                 slot.pop_from(-k)
-                return True
+                return k
         else:
-            return False
+            return 0
 
     def is_empty(self):
         try:
@@ -84,8 +89,7 @@ class Slot(object):
 
     @property
     def base_size(self):
-        global card_size
-        return card_size
+        return deck.card_size  # follows deck resizes
 
     def _step_height(self):
         if not self.spread:
@@ -139,13 +143,21 @@ class Slot(object):
         self._peeking_at = None
 
     def render(self):
-        # TODO improve perf
+        """
+        Return surface of area() size ; covered cards only get their visible strip blitted,
+        so the cost follows the visible area rather than the stack length
+        """
         w, h = self.base_size
-        surface = pygame.Surface(size=(w, self.spreadth * h if self.spread else h))
+        surface = display_format(pygame.Surface(size=self.area().size))
         surface.fill(Colors.light_green, pygame.Rect(0, 0, w, h))
-        surface.set_colorkey(Colors.black)
-        for i, card in enumerate(self):  # TODO reverse order to lazy blit
-            surface.blit(card.render(), self.get_position(i))
+        surface.set_colorkey(Colors.black)  # no RLEACCEL: rebuilt and blitted once per frame, encoding would cost more
+        step = self._step_height()
+        if step:
+            strip = pygame.Rect(0, 0, w, step)
+            for i, card in enumerate(self.stack[:-1]):
+                surface.blit(card.render(), (0, i * step), strip)
+        if self.stack:
+            surface.blit(self[-1].render(), self.get_position(-1))
         if self._peeking_at is not None:
             surface.blit(self[self._peeking_at].render(), self.get_position(self._peeking_at))
         return surface
@@ -154,7 +166,7 @@ class Slot(object):
         return self.stack.copy()
 
     def load(self, from_stack):
-        self.stack = from_stack
+        self.stack = list(from_stack)
 
 
 class FoundationSlot(Slot):
@@ -169,7 +181,7 @@ class FoundationSlot(Slot):
             else:
                 raise ValueError(f'First on FoundationSlot must be an Ace, got {card}')
         else:
-            if card.suit == topmost.suit and card.number == topmost.number + 1:
+            if card.id == topmost.id + 1 and card.number != 1:
                 super().put_single(card)
             else:
                 raise ValueError(f'Expecting following to {topmost} got {card}')
@@ -192,10 +204,8 @@ class ToggleSlot(Slot):
     def render(self):
         srf = super().render()
         if self._toggle:
-            shade = pygame.Surface(size=self.area().size)
-            shade.fill(Colors.blueish)
-            shade.set_alpha(100)
-            srf.blit(shade, self.area())
+            area = self.area()
+            srf.blit(shade(area.size, Colors.blueish, 100), area)
         return srf
 
 
@@ -215,8 +225,9 @@ class ReserveSlot(ToggleSlot):
 class TableauSlot(ToggleSlot):
     """docstring for TableauSlot"""
 
-    def __init__(self):
-        super().__init__(spread=True, spreadth=2.5)
+    def __init__(self, spreadth=2.5):
+        """spreadth -> height of the spread stack in card heights"""
+        super().__init__(spread=True, spreadth=spreadth)
 
     def put_single(self, card):
         try:
@@ -224,7 +235,7 @@ class TableauSlot(ToggleSlot):
         except IndexError:
             super().put_single(card)
         else:
-            if card.number == topmost.number - 1 and card.suit.index % 2 != topmost.suit.index % 2:
+            if card.number == topmost.number - 1 and card.color != topmost.color:
                 super().put_single(card)
             else:
                 raise ValueError(f'{card} cannot stack on {topmost}')
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import pygame
 import pygame.freetype
-from pygame.constants import RESIZABLE, KEYDOWN, QUIT
+from pygame.constants import RESIZABLE, KEYDOWN, QUIT, RLEACCEL
 from collections import namedtuple
 from functools import partial, singledispatch, reduce
 from itertools import chain, cycle, starmap
@@ -14,6 +14,7 @@ import random
 card_ratio = 8 / 5  # heigth / width
 card_size = (75, 120)
 font = None
+theme = None  # theme.Theme drawing card faces, procedural drawing if None
 font_selection = [
     'dejavusansmono',
     'freeserif',
@@ -53,13 +54,57 @@ class Suits(object):
     spade, heart, clover, diamond = suits
 
 
+def card_id(number, suit):
+    """
+    Integer identity of a card: 0-51 ordered by suit then number, -1 for suitless cards
+    """
+    if suit is None:
+        return -1
+    return 13 * suit.index + number - 1
+
+
 class FrenchCard(object):
+    """
+    Interned flyweight card: a single instance per class and card id.
+    color is the precomputed suit color parity (0 black, 1 red)
+    """
+    __slots__ = ('id', 'number', 'suit', 'color')
     court = {1: 'A', 11: 'J', 12: 'Q', 13: 'K'}
+    _interned = {}  # (class, id) -> instance
+
+    def __new__(cls, number=1, suit=Suits.spade, **kwargs):
+        key = cls, card_id(number, suit)
+        try:
+            return cls._interned[key]
+        except KeyError:
+            self = super().__new__(cls)
+            self.id = key[1]
+            self.number = number
+            self.suit = suit
+            self.color = -1 if suit is None else suit.index % 2
+            cls._interned[key] = self
+            return self
+
+    def __init__(self, number=1, suit=Suits.spade):
+        pass  # see __new__
+
+    def __eq__(self, other):
+        try:
+            return self.id == other.id
+        except AttributeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return self.id
+
+    def __reduce__(self):
+        return self.__class__, (self.number, self.suit)
+
+    def __copy__(self):
+        return self
 
-    def __init__(self, number=1, suit=Suits.spade, **kwargs):
-        super().__init__(**kwargs)
-        self.number = number
-        self.suit = suit
+    def __deepcopy__(self, memo):
+        return self
 
     @ property
     def value(self):
@@ -75,32 +120,43 @@ class FrenchCard(object):
         return self.value + self.suit.symbol
 
 
+surfaces = {}  # card id -> rendered surface
+
+
 class CardSurface(FrenchCard):
     """
     Abstract class for card object meant to be displayed
     abstract method: render()
+    NB: rendered surfaces are cached in surfaces, keyed by card id
     """
+    __slots__ = ('size', 'font')
 
-    def __init__(self, number=0, suit=None, size=None, **kwargs):
-        super().__init__(number=number, suit=suit, **kwargs)
-        if size is None:
-            self.size = card_size
+    def __new__(cls, number=0, suit=None, **kwargs):
+        return super().__new__(cls, number=number, suit=suit)
+
+    def __init__(self, number=0, suit=None, size=None, font=None):
+        super().__init__(number=number, suit=suit)
+        if size is not None or not hasattr(self, 'size'):
+            self.size = card_size if size is None else size
+        if font is not None or not hasattr(self, 'font'):
+            self.font = font
 
     @property
     def surface(self):
         try:
-            return self._surface
-        except AttributeError:
-            self._surface = pygame.Surface(self.size)
-            self._surface.fill(Colors.white)
-            if 'font' not in dir(self) or self.font is None:
+            return surfaces[self.id]
+        except KeyError:
+            surfaces[self.id] = pygame.Surface(self.size)
+            surfaces[self.id].fill(Colors.white)
+            if self.font is None:
                 global font
                 if font is None:
                     font = pygame.freetype.SysFont(','.join(font_selection), 80)
                 self.font = font
             with suppress(ValueError, ZeroDivisionError, StopIteration):
                 self.render_surface()
-            return self._surface
+            surfaces[self.id] = display_format(surfaces[self.id])
+            return surfaces[self.id]
 
     def render(self):
         """NB: rendered surface is cached ; call clear to trully render again"""
@@ -113,15 +169,47 @@ class CardSurface(FrenchCard):
         """
         Clear surface to trigger rendering
         """
-        try:
-            del self._surface
-        except AttributeError:
-            pass
+        surfaces.pop(self.id, None)
 
     def resize(self, new_size):
         self.size = new_size
         self.clear()
 
+    def convert(self):
+        """
+        Convert cached surface to the current display format, without rendering again
+        """
+        with suppress(KeyError):
+            surfaces[self.id] = display_format(surfaces[self.id])
+
+
+def display_format(surface, alpha=False):
+    """
+    Return surface converted to the display pixel format for fast blits.
+    Surface is returned untouched while no display mode is set.
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+
+def shade(size, color, alpha):
+    """
+    Return cached uniform translucent overlay, RLE accelerated
+    """
+    key = (tuple(size), color, alpha)
+    try:
+        return _shades[key]
+    except KeyError:
+        srf = display_format(pygame.Surface(size=size))
+        srf.fill(color)
+        srf.set_alpha(alpha, RLEACCEL)
+        _shades[key] = srf
+        return srf
+
+
+_shades = {}
+
 
 court_pic = {11: '♗', 12: '♕', 13: '♔'}
 # court_pic = {11: '♞', 12: '♛', 13: '♚'}  # unicode U+265A, 265B, 265E
@@ -218,11 +306,7 @@ class Card(CardSurface):
     """
     CardSurface rendered procedurally from unicode symbols.
     """
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        with suppress(KeyError):
-            self.font = kwargs['font']
+    __slots__ = ()
 
     def blit_text_to(self, surface, text, position, centered=True):
         txt_srf, _ = font_fill(self.font, text, size=position.size, fgcolor=self.suit.color)
@@ -231,6 +315,9 @@ class Card(CardSurface):
         surface.blit(txt_srf, position)
 
     def render_surface(self):
+        if theme is not None and self.id in theme:
+            self.surface.blit(theme.face(self.id, self.size), (0, 0))
+            return
         card = self.surface.get_rect()
         # border
         pygame.draw.rect(self.surface, Colors.black, card, 1)
@@ -292,6 +379,8 @@ class Card(CardSurface):
 
 
 class EmptySlot(CardSurface):
+    __slots__ = ()
+
     def render(self):
         self.surface.fill(Colors.light_green)
         return self.surface
@@ -299,11 +388,36 @@ class EmptySlot(CardSurface):
 
 empty_card = EmptySlot()
 deck = [Card(number=i, suit=Suits.suits[s]) for s in range(4) for i in range(1, 14)]
+cards = tuple(deck)  # indexed by card id
+
+
+def convert():
+    """
+    Convert cached surfaces to the display format ; call after display mode change
+    """
+    _shades.clear()
+    for c in chain(deck, [empty_card]):
+        c.convert()
+
+
+def set_theme(new_theme):
+    """
+    new_theme -> theme.Theme, None for procedural drawing
+    Cards render again from the theme faces already scaled to the current size, if any
+    """
+    global theme
+    theme = new_theme
+    for c in deck:
+        c.clear()
 
 
 def _resize(new_size):
     global card_size
+    if new_size == card_size:
+        convert()
+        return card_size
     card_size = new_size
+    _shades.clear()
     for c in chain(deck, [empty_card]):
         c.resize(new_size)
     return card_size
@@ -333,6 +447,22 @@ def shuffle():
     random.shuffle(deck)
 
 
+ms_suits = [Suits.clover, Suits.diamond, Suits.heart, Suits.spade]  # Microsoft deal order
+
+
+def deal(number):
+    """
+    Return card ids in dealing order for numbered deal, compatible with Microsoft FreeCell
+    """
+    seed = number
+    cards = list(range(51, -1, -1))  # Microsoft card index: 4 * rank + suit
+    for i in range(52):
+        seed = (seed * 214013 + 2531011) & 0x7FFFFFFF
+        j = 51 - (seed >> 16) % (52 - i)
+        cards[i], cards[j] = cards[j], cards[i]
+    return tuple(card_id(c // 4 + 1, ms_suits[c % 4]) for c in cards)
+
+
 def show_deck(screen, suit_offset=0, clean=True):
     if(clean):
         screen.fill(Colors.green)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Heuristic difficulty of numbered deals, without solving them.
+
+Features are computed vectorized on the initial cascades of many deals at once:
+    buried_low   depth of aces, 2s and 3s under other cards (aces weigh most)
+    early_depth  depth of every card weighted by how early it is needed
+    same_color   adjacent cards of a cascade with the same color
+    natural      adjacent cards already forming a tableau run (eases the deal)
+    inversions   cards above a lower card of the same suit in their cascade
+Scores are a weighted sum of features ; higher is harder.
+
+Usage:
+    difficulty.py score FIRST LAST [--top N]      rank deals, report throughput
+    difficulty.py solve FIRST LAST STATS.csv      write solver stats of deals
+    difficulty.py calibrate STATS.csv             compare scores to solver stats
+"""
+import argparse
+import csv
+import numpy as np
+from time import perf_counter
+from vecenv import deal_batch
+
+weights = {'buried_low': 1.0, 'early_depth': 0.5, 'same_color': 1.0, 'natural': -2.0, 'inversions': 0.5}
+
+# card k of a deal lands in cascade k % 8 at row k // 8 ; cascades 0-3 hold 7 cards, 4-7 hold 6
+_k = np.arange(52)
+_column, _row = _k % 8, _k // 8
+depth = np.where(_column < 4, 7, 6) - 1 - _row  # cards above card k
+below, above = np.array([(i, j) for i in range(52) for j in range(i + 8, 52, 8)]).T  # same cascade pairs
+
+
+def features(deals):
+    """
+    deals -> card ids (N, 52) in dealing order
+    Return dict of feature name -> array (N,)
+    """
+    number = (deals % 13 + 1).astype(np.int16)
+    suit = deals // 13
+    color = suit % 2
+    lower, upper = number[:, :-8], number[:, 8:]  # card k and the card dealt on top of it
+    return {
+        'buried_low': (depth * np.maximum(0, 4 - number)).sum(1),
+        'early_depth': (depth * (14 - number)).sum(1) / 13,
+        'same_color': (color[:, :-8] == color[:, 8:]).sum(1),
+        'natural': ((upper == lower - 1) & (color[:, :-8] != color[:, 8:])).sum(1),
+        'inversions': ((suit[:, below] == suit[:, above]) & (number[:, above] > number[:, below])).sum(1),
+    }
+
+
+def score_deals(deals, w=weights):
+    return sum(w[name] * value for name, value in features(deals).items())
+
+
+def score(deal_numbers, batch=1 << 17, w=weights):
+    """Return difficulty scores of deal numbers, computed by batch"""
+    deal_numbers = np.asarray(deal_numbers)
+    resp = np.empty(len(deal_numbers))
+    for k in range(0, len(deal_numbers), batch):
+        resp[k:k + batch] = score_deals(deal_batch(deal_numbers[k:k + batch]), w)
+    return resp
+
+
+def solve_stats(first, last, path, budget=10.0):
+    """Write deal, status, nodes, moves and seconds from solver.search to csv"""
+    import solver
+    with open(path, 'w', newline='') as f:
+        out = csv.writer(f)
+        out.writerow(['deal', 'status', 'nodes', 'moves', 'seconds'])
+        for deal in range(first, last + 1):
+            pos = solver.deal_position(deal)
+            start = perf_counter()
+            status, line, nodes = solver.search(pos, deadline=start + budget)
+            out.writerow([deal, status, nodes, len(line or ()), f'{perf_counter() - start:.3f}'])
+            f.flush()
+
+
+def ranks(values):
+    resp = np.empty(len(values))
+    resp[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return resp
+
+
+def spearman(a, b):
+    return np.corrcoef(ranks(a), ranks(b))[0, 1]
+
+
+def calibrate(path):
+    """Print how scores and features compare with solver stats"""
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    deals = np.array([int(r['deal']) for r in rows])
+    nodes = np.array([int(r['nodes']) for r in rows], dtype=float)
+    solved = np.array([r['status'] == 'won' for r in rows])
+    hardness = np.log1p(nodes) + np.where(solved, 0, np.log1p(nodes.max()))  # unsolved are hardest
+    feats = features(deal_batch(deals))
+    scores = score_deals(deal_batch(deals))
+    print(f'{len(rows)} deals, {solved.sum()} solved')
+    print(f'spearman(score, solver effort) = {spearman(scores, hardness):+.3f}')
+    for name, value in feats.items():
+        print(f'  {name:>12}: spearman {spearman(value, hardness):+.3f}')
+    print('score decile: mean solver nodes, solved ratio')
+    order = np.argsort(scores, kind='stable')
+    for k, part in enumerate(np.array_split(order, 10)):
+        if len(part):
+            print(f'  {k + 1:>2}: {nodes[part].mean():>10.0f} {solved[part].mean():>6.1%}')
+    x = np.column_stack([feats[name] for name in weights] + [np.ones(len(deals))])
+    fit, *_ = np.linalg.lstsq(x, hardness, rcond=None)
+    fitted = {name: round(float(w), 3) for name, w in zip(weights, fit)}
+    print(f'least squares weights: {fitted}')
+    print(f'spearman(fitted score, solver effort) = {spearman(x @ fit, hardness):+.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Heuristic difficulty of numbered deals')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('score')
+    p.add_argument('first', type=int)
+    p.add_argument('last', type=int)
+    p.add_argument('--top', type=int, default=10)
+    p = commands.add_parser('solve')
+    p.add_argument('first', type=int)
+    p.add_argument('last', type=int)
+    p.add_argument('stats')
+    p.add_argument('--budget', type=float, default=10.0, help='seconds per deal')
+    p = commands.add_parser('calibrate')
+    p.add_argument('stats')
+    args = parser.parse_args()
+    if args.command == 'score':
+        deal_numbers = np.arange(args.first, args.last + 1)
+        start = perf_counter()
+        scores = score(deal_numbers)
+        elapsed = perf_counter() - start
+        order = np.argsort(scores, kind='stable')
+        print(f'{len(scores)} deals scored in {elapsed:.2f}s ({len(scores) / elapsed * 60:.0f} deals/min)')
+        print('easiest:', ' '.join(f'{d}({s:.1f})' for d, s in zip(deal_numbers[order[:args.top]], scores[order[:args.top]])))
+        print('hardest:', ' '.join(f'{d}({s:.1f})' for d, s in zip(deal_numbers[order[::-1][:args.top]], scores[order[::-1][:args.top]])))
+    elif args.command == 'solve':
+        solve_stats(args.first, args.last, args.stats, args.budget)
+    else:
+        calibrate(args.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Input event recording and deterministic UI performance replay.
+
+A recording is a JSON lines file: a header {"deal": n, "screensize": [w, h], "tables": n,
+"variant": [variants.Variant fields]} where tables after the first hold the next deal numbers,
+then one line per handled event {"t": ms since start, "type": event type, ...attributes}.
+Replay feeds the events through freecell handlers under the SDL dummy driver,
+as fast as possible, and reports per-event latency and frame time distributions.
+"""
+import os
+import json
+import argparse
+import pygame
+from collections import defaultdict
+from statistics import mean, quantiles
+from time import perf_counter
+import variants
+
+attributes = ['pos', 'button', 'unicode', 'key', 'mod', 'size', 'w', 'h']
+
+
+def encode_event(event, t):
+    line = {'t': t, 'type': event.type}
+    for a in attributes:
+        try:
+            value = getattr(event, a)
+        except AttributeError:
+            continue
+        line[a] = list(value) if isinstance(value, tuple) else value
+    return line
+
+
+def decode_event(line):
+    """Return tuple(ms timestamp, pygame event)"""
+    line = dict(line)
+    t = line.pop('t')
+    event_type = line.pop('type')
+    attrs = {k: tuple(v) if isinstance(v, list) else v for k, v in line.items()}
+    return t, pygame.event.Event(event_type, attrs)
+
+
+class Recorder(object):
+    """
+    Record events handled by freecell.process_events to a file
+    """
+
+    def __init__(self, path, deal_number, screensize, tables=1, variant=variants.freecell):
+        self.file = open(path, 'w')
+        self.start = perf_counter()
+        json.dump({'deal': deal_number, 'screensize': list(screensize), 'tables': tables, 'variant': list(variant)},
+                  self.file)
+        self.file.write('\n')
+
+    def record(self, events):
+        t = int((perf_counter() - self.start) * 1000)
+        for event in events:
+            json.dump(encode_event(event, t), self.file)
+            self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+def load(path):
+    """Return tuple(header, [(ms timestamp, event)])"""
+    with open(path) as f:
+        header = json.loads(next(f))
+        return header, [decode_event(json.loads(line)) for line in f if line.strip()]
+
+
+def replay(path):
+    """
+    Replay recorded events through freecell handlers as the main loop does
+    Return tuple(latencies, frames) where latencies -> {event type name: [seconds]}
+    and frames -> [seconds] of refresh_display
+    """
+    import freecell
+    header, events = load(path)
+    variant = variants.Variant(*header['variant']) if 'variant' in header else variants.freecell
+    freecell.init(header['deal'], header.get('tables', 1), variant)
+    if pygame.display.get_surface().get_size() != tuple(header['screensize']):
+        freecell.resize(tuple(header['screensize']))  # as freecell.on_resize does
+    latencies = defaultdict(list)
+    frames = []
+    try:
+        for t, event in events:
+            start = perf_counter()
+            with_quit = False
+            try:
+                change = freecell.process_events([event])
+                change = freecell.process_differed_events(force=True) or change
+            except EOFError:
+                with_quit = True
+                change = False
+            if change:
+                freecell.push_to_foundation()
+                freecell.analyse_tables()
+                frame = perf_counter()
+                freecell.refresh_display()
+                frames.append(perf_counter() - frame)
+            latencies[pygame.event.event_name(event.type)].append(perf_counter() - start)
+            if with_quit:
+                break
+    finally:
+        pygame.quit()
+    return latencies, frames
+
+
+def summary(name, samples):
+    ms = [s * 1000 for s in samples]
+    if len(ms) > 1:
+        p50, p95, p99 = (quantiles(ms, n=100, method='inclusive')[k] for k in (49, 94, 98))
+    else:
+        p50 = p95 = p99 = ms[0]
+    return (f'{name:>16} n={len(ms):<6} mean={mean(ms):7.3f}ms p50={p50:7.3f}ms '
+            f'p95={p95:7.3f}ms p99={p99:7.3f}ms max={max(ms):7.3f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded events and report UI latency')
+    parser.add_argument('recording', help='file recorded with freecell.py --record')
+    args = parser.parse_args()
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    latencies, frames = replay(args.recording)
+    for name, samples in sorted(latencies.items()):
+        print(summary(name, samples))
+    if frames:
+        print(summary('frame', frames))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Headless PNG export of board states, rendered by the game drawing code
+under the SDL dummy driver.
+
+Games are spread over a process pool ; each worker renders the card faces
+once, then draws every board from the shared card surfaces.
+
+Usage:
+    export.py deal FIRST LAST OUT               initial boards of numbered deals
+    export.py log LOGFILE... OUT [--steps]      positions reached by move logs, see replay
+    export.py solve FIRST LAST OUT              every step of solver lines
+"""
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import argparse  # noqa: E402
+from multiprocessing import Pool  # noqa: E402
+from time import perf_counter  # noqa: E402
+import pygame  # noqa: E402
+import deck  # noqa: E402
+import replay  # noqa: E402
+
+image_size = (640, 480)
+_game = None  # worker table
+_screen = None  # worker drawing surface
+
+
+def init_worker(size=image_size):
+    """Set up the dummy display and render card faces once for this process"""
+    global _game, _screen
+    import freecell
+    pygame.init()
+    pygame.display.set_mode(size)
+    _screen = pygame.Surface(size)
+    w, h = deck.set_size(size, cols=8, rows=3.5, margin=freecell.margin * size[0])
+    for card in deck.deck:
+        card.render()
+    _game = freecell.Game()
+    _game.size = size
+    _game.layout(freecell.margin * size[0] / w)
+
+
+def render_game(job):
+    """
+    job -> tuple(path, deal number, moves, steps) ; steps to save every position,
+    as path-NNN.png, instead of the last one as path.png
+    Return the number of images written
+    """
+    path, deal_number, moves, steps = job
+    _game.deal_cards(deck.deal(deal_number))
+    if not steps:
+        _game.apply_moves(moves)
+        save(f'{path}.png')
+        return 1
+    save(f'{path}-000.png')
+    for k, move in enumerate(moves, 1):
+        _game.apply_moves([move])
+        save(f'{path}-{k:03}.png')
+    return len(moves) + 1
+
+
+def save(path):
+    _game.render(_screen)
+    pygame.image.save(_screen, path)
+
+
+def solve_line(deal_number, budget=10.0):
+    """Return solver moves winning deal_number, empty if none found within budget seconds"""
+    import solver
+    pos = solver.deal_position(deal_number)
+    status, line, nodes = solver.search(pos, deadline=perf_counter() + budget)
+    return line or []
+
+
+def export(jobs, size=image_size, processes=None, chunksize=8):
+    """Render jobs in a process pool ; yield images written per job"""
+    with Pool(processes, initializer=init_worker, initargs=(size,)) as pool:
+        yield from pool.imap_unordered(render_game, jobs, chunksize=chunksize)
+        pool.close()  # let workers exit rather than terminate them
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export board images')
+    parser.add_argument('--size', type=int, nargs=2, default=image_size, metavar=('W', 'H'))
+    parser.add_argument('--processes', type=int, default=None)
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('deal')
+    p.add_argument('first', type=int)
+    p.add_argument('last', type=int)
+    p.add_argument('out')
+    p = commands.add_parser('log')
+    p.add_argument('logs', nargs='+')
+    p.add_argument('out')
+    p.add_argument('--steps', action='store_true', help='export every position of each game')
+    p = commands.add_parser('solve')
+    p.add_argument('first', type=int)
+    p.add_argument('last', type=int)
+    p.add_argument('out')
+    p.add_argument('--budget', type=float, default=10.0, help='seconds per deal')
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    if args.command == 'deal':
+        jobs = [(os.path.join(args.out, f'deal-{n}'), n, [], False) for n in range(args.first, args.last + 1)]
+    elif args.command == 'log':
+        jobs = []
+        for path in args.logs:
+            with open(path) as f:
+                for line in map(str.strip, f):
+                    if line:
+                        n, moves = replay.parse_log(line)
+                        jobs.append((os.path.join(args.out, f'game-{len(jobs)}-{n}'), n, moves, args.steps))
+    else:
+        deals = range(args.first, args.last + 1)
+        with Pool(args.processes) as pool:
+            lines = pool.starmap(solve_line, [(n, args.budget) for n in deals])
+            pool.close()
+            pool.join()
+        jobs = [(os.path.join(args.out, f'solve-{n}'), n, line, True) for n, line in zip(deals, lines) if line]
+    start = perf_counter()
+    images = sum(export(jobs, tuple(args.size), args.processes))
+    elapsed = perf_counter() - start
+    print(f'{images} images in {elapsed:.2f}s ({images / elapsed * 60:.0f} images/min)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,22 @@
 import pygame
 import pygame.freetype
+import pygame.sysfont
 from pygame.constants import KEYDOWN, QUIT, RESIZABLE
 from deck import Colors
 from functools import partial
-from itertools import chain
+from itertools import chain, islice
+from multiprocessing import Pool
+from collections import namedtuple
+import argparse
+import pickle
 import os
 
 main_dir = os.path.dirname(os.path.abspath(__file__))
 fonts_dir = os.path.join(main_dir, 'data', 'fonts')
+cache_path = os.path.join(main_dir, 'font_finder.cache')
 
 symbols = '{} ♠♥♣♦♞♛♚'  # unicode U+2660, 2663, 2665, 2666, 265A, 265B, 265E
+glyphs = '♠♥♣♦♤♡♧♢♗♕♔♞♛♚'  # suit and chess symbols used by deck
 
 selection = ['dejavusans',
              'dejavusansmono',
@@ -18,6 +25,25 @@ selection = ['dejavusans',
              'wenquanyimicrohei',
              'wenquanyimicroheimono', ]
 
+Preview = namedtuple('Preview', ['name', 'size', 'pixels', 'supported'])  # pixels -> RGBA bytes
+
+
+def font_file(font_name):
+    """Return tuple(name, path) ; path None if unknown"""
+    try:
+        fn, fp = font_name
+    except ValueError:
+        return font_name, pygame.sysfont.match_font(font_name)
+    else:
+        return fn, fp
+
+
+def mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return 0
+
 
 def render(font_name):
     try:
@@ -30,14 +56,96 @@ def render(font_name):
     return font.render(symbols.format(fn), fgcolor=Colors.white)
 
 
-def print_screen(screen, screensize, flist):
+def supported_glyphs(font_name):
+    """Return the glyphs the font has among glyphs"""
+    try:
+        fn, fp = font_name
+    except ValueError:
+        font = pygame.freetype.SysFont(font_name, 16)
+    else:
+        font = pygame.freetype.Font(fp, 16)
+    return ''.join(g for g, metrics in zip(glyphs, font.get_metrics(glyphs)) if metrics is not None)
+
+
+def preview(font_name):
+    """Worker task ; return Preview or None if the font does not load"""
+    try:
+        surf, (_, _, w, h) = render(font_name)
+        supported = supported_glyphs(font_name)
+    except OSError:
+        return None
+    name = font_name if isinstance(font_name, str) else font_name[0]
+    return Preview(name, surf.get_size(), pygame.image.tobytes(surf, 'RGBA'), supported)
+
+
+def init_worker():
+    pygame.freetype.init()
+
+
+class Previews(object):
+    """
+    Font previews rasterized by a worker pool, batch by batch as they are iterated,
+    the next batch being prepared ahead ; results are cached on disk by font file mtime
+    """
+
+    def __init__(self, pool, path=cache_path, batch=48):
+        self.pool = pool
+        self.path = path
+        self.batch = batch
+        try:
+            with open(path, 'rb') as f:
+                self.cache = pickle.load(f)  # (name, path) -> tuple(mtime, Preview or None)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.cache = {}
+        self.changed = False
+
+    def cached(self, font_name):
+        try:
+            t, resp = self.cache[font_file(font_name)]
+        except KeyError:
+            return False, None
+        return t == mtime(font_file(font_name)[1]), resp
+
+    def _submit(self, font_names):
+        missing = [f for f in font_names if not self.cached(f)[0]]
+        return missing, self.pool.map_async(preview, missing)
+
+    def _collect(self, pending):
+        missing, result = pending
+        for font_name, resp in zip(missing, result.get()):
+            self.cache[font_file(font_name)] = (mtime(font_file(font_name)[1]), resp)
+            self.changed = True
+
+    def __call__(self, flist):
+        """Yield Preview of fonts in flist, skipping fonts that fail to load"""
+        batches = iter(partial(lambda it: list(islice(it, self.batch)), iter(flist)), [])
+        current = next(batches, None)
+        pending = self._submit(current) if current else None
+        while current:
+            following = next(batches, None)
+            ahead = self._submit(following) if following else None
+            self._collect(pending)
+            for font_name in current:
+                resp = self.cache[font_file(font_name)][1]
+                if resp is not None:
+                    yield resp
+            current, pending = following, ahead
+
+    def save(self):
+        if self.changed:
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.cache, f)
+            self.changed = False
+
+
+def print_screen(screen, screensize, previews):
     m = 5
     curw = px = py = 0
-    for font in flist:
-        try:
-            surf, (_, _, w, h) = render(font)
-        except OSError:
-            continue
+    for p in previews:
+        surf = pygame.image.frombytes(p.pixels, p.size, 'RGBA')
+        if p.supported != glyphs:  # grey out fonts missing glyphs
+            surf.fill((127, 127, 127, 255), special_flags=pygame.BLEND_RGBA_MULT)
+        w, h = p.size
         py += m
         curw = max(curw, w)
         if py + h > screensize[1]:  # new column
@@ -45,37 +153,55 @@ def print_screen(screen, screensize, flist):
             px += curw + m
             curw = 0
         if px + w > screensize[0]:  # new screen
+            pygame.display.update()
             px = py = m
             curw = w
             yield True
         screen.blit(surf, (px, py))
-        pygame.display.update()
         py += h
+    pygame.display.update()
     yield True
 
 
+def font_list():
+    try:
+        custom = ((n, os.path.join(fonts_dir, n)) for n in os.listdir(fonts_dir))
+    except OSError:
+        custom = []
+    return list(chain(custom, sorted(pygame.freetype.get_fonts()),))
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Browse fonts rendering the card symbols')
+    parser.add_argument('--list', action='store_true', help='print fonts having all the card symbols and exit')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
     try:
         pygame.freetype.init()
-        screensize = (800, 600)
-        screen = pygame.display.set_mode(screensize, RESIZABLE)
-        screen.fill(Colors.black)
-        try:
-            custom = ((n, os.path.join(fonts_dir, n)) for n in os.listdir(fonts_dir))
-        except OSError:
-            custom = []
-        flist = list(chain(custom, sorted(pygame.freetype.get_fonts()),))
-        # print(flist)
-        print_s = partial(print_screen, screen, screensize)
-        while True:
-            for wait in chain(print_s(selection), print_s(flist)):
-                while wait:
-                    for event in pygame.event.get():
-                        if event.type == QUIT:
-                            return
-                        if event.type == KEYDOWN:
-                            screen.fill(Colors.black)
-                            wait = False
+        flist = font_list()
+        with Pool(args.processes, initializer=init_worker) as pool:
+            previews = Previews(pool)
+            try:
+                if args.list:
+                    for p in previews(chain(selection, flist)):
+                        if p.supported == glyphs:
+                            print(p.name)
+                    return
+                screensize = (800, 600)
+                screen = pygame.display.set_mode(screensize, RESIZABLE)
+                screen.fill(Colors.black)
+                print_s = partial(print_screen, screen, screensize)
+                while True:
+                    for wait in chain(print_s(previews(selection)), print_s(previews(flist))):
+                        while wait:
+                            for event in pygame.event.get():
+                                if event.type == QUIT:
+                                    return
+                                if event.type == KEYDOWN:
+                                    screen.fill(Colors.black)
+                                    wait = False
+            finally:
+                previews.save()
     finally:
         pygame.quit()
 
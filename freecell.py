@@ -1,14 +1,29 @@
 #!/usr/bin/env python3
 import deck
-from board import ReserveSlot, FoundationSlot, TableauSlot
+import savegame
+import replay
+import eventlog
+import spectate
+import theme
+import solvecache
+import analysis
+import solver
+import stats
+import variants
+from board import ReserveSlot, FoundationSlot
 import pygame
 from pygame.constants import KEYDOWN, QUIT, RESIZABLE, VIDEORESIZE, MOUSEBUTTONDOWN, MOUSEBUTTONUP
 from collections import defaultdict, deque, namedtuple
 from functools import reduce
 from copy import copy
-from itertools import chain, cycle
+from itertools import chain
+from math import ceil, sqrt
 import operator
 from contextlib import suppress
+import random
+import argparse
+import threading
+from time import perf_counter
 
 
 def on_quit(event):
@@ -25,112 +40,513 @@ def on_resize(event):
     delay(action=lambda: resize(event.size), key='resize')
 
 
-_focus = None
+def count_empty(iterable_slots):
+    return sum(map(lambda x: x.is_empty(), iterable_slots))
+
 
+class Game(object):
+    """
+    One FreeCell table: board, history and focus.
+    Tables only hold slots of the shared deck cards, so they share rendered card surfaces.
+    variant -> rules of the table ; see variants
+    """
 
-def unfocus():
-    global _focus
-    if _focus is None:
+    def __init__(self, origin=(0, 0), analyse=True, variant=variants.freecell):
+        self.variant = variant
+        self.rules = variants.compile(variant)
+        self.reserve = [ReserveSlot() for i in range(variant.cells)]
+        self.foundation = [FoundationSlot() for i in range(4)]
+        self.tableau = [self.rules.tableau_slot() for i in range(variant.cascades)]
+        self.board = (self.reserve, self.foundation, self.tableau)
+        self.slots = list(chain(*self.board))  # indexes of recorded moves
+        self.slotmap = {}  # position -> slot  where position is in percent card_size
+        self.origin = origin  # topleft pixel of the table on screen
+        self.size = (0, 0)
+        self.dirty = True  # needs redraw
+        self.finished = False
+        self._focus = None
+        self._peek = []
+        self._finisher = None  # tuple(position, search thread, result) while auto-finish searches
+        self._finishing = None  # tuple(remaining moves, expected position) while auto-finish plays
+        self.started = None  # perf_counter time the game started, None once recorded to stats
+        self.undos = 0
+        self.history = deque()
+        self.history_current = None
+        self.history_future = deque()
+        self.history_log = []  # move groups between consecutive history states, past and future
+        self._pending = []  # moves played since the current history state
+        self.deal = ()  # card ids in dealing order
+        self.deal_number = None  # numbered deal, None if dealt otherwise
+        self.analyser = analysis.Analyser(budget=0.003, rules=self.rules.solver) if analyse else None
+        self.position_analysis = None
+        self.analysed = None  # position of position_analysis
+        self._analysis_due = None  # tuple(previous position) once save_board_state ran, see analyse_due
+
+    def layout(self, m):
+        """m -> margin in % card_width ; reserve and foundation on the first row, tableau below"""
+        self.slotmap.clear()
+        for row, slots in enumerate((self.reserve + self.foundation, self.tableau)):
+            for k, slot in enumerate(slots):
+                relativePosition = (m + (1 + m) * k, m + (1 + m) * row)
+                self.slotmap[relativePosition] = slot
+
+    def columns(self):
+        """Return the number of card columns of the layout"""
+        return max(len(self.reserve) + len(self.foundation), len(self.tableau))
+
+    def standard(self, action):
+        """Return True if the table plays standard FreeCell, else print that action is not available"""
+        if self.variant == variants.freecell:
+            return True
+        print(f'{action} is only available for standard FreeCell, not {self.variant.name}')
         return False
-    else:
-        _focus.toggle(False)
-        _focus = None
-        return True
 
+    def new_deal(self, number=None):
+        if not self.finished:
+            self.record_stats(won=False)  # abandoned
+        number = random.randint(1, 1000000) if number is None else number
+        self.deal_cards(deck.deal(number))
+        self.deal_number = number
+        # init history+
+        self.unfocus()
+        self.history.clear()
+        self.history_future.clear()
+        self.history_log.clear()
+        self._pending.clear()
+        self.history_current = None
+        self.finished = False
+        self.started = perf_counter()
+        self.undos = 0
+        self._finishing = None  # stop playing an auto-finish line
+        self.save_board_state()
+        publish_snapshot(self)
+
+    def record_stats(self, won):
+        """Record the game to stats once, when won or abandoned after some moves"""
+        moves = len(self.move_log()[1])
+        if stats_writer is None or self.started is None or not (won or moves) or self.variant != variants.freecell:
+            return
+        stats_writer.record(self.deal_number, moves, self.undos, perf_counter() - self.started, won)
+        self.started = None
+
+    def deal_cards(self, card_ids):
+        """Reset the board and deal cards to the tableau, and to the reserve as the variant says"""
+        self.deal = tuple(card_ids)
+        self.deal_number = None
+        cells, cascades = variants.deal(self.variant, self.deal)
+        for slot, ids in zip(chain(self.reserve, self.tableau), chain(cells, cascades)):
+            slot.load([deck.cards[card_id] for card_id in ids])
+        for slot in self.foundation:
+            slot.load([])
+        self.dirty = True
+
+    def unfocus(self):
+        if self._focus is None:
+            return False
+        else:
+            self._focus.toggle(False)
+            self._focus = None
+            return True
 
-def click(position):
-    global _focus
-    pos, slot = get_slot(position)
-    if _focus is None or slot is _focus:
+    def click(self, position):
+        pos, slot = self.get_slot(position)
+        if self._focus is None or slot is self._focus:
+            try:
+                self._focus = slot if slot.toggle() else None
+            except AttributeError:
+                return False
+            else:
+                return True
+        else:
+            changed = self.move(slot, self._focus,
+                                max_cards=self.rules.supermove(count_empty(self.reserve), count_empty(self.tableau)))
+            print(changed)
+            self.unfocus()
+            if changed:
+                self.save_board_state()
+            return True
+
+    def move(self, to_slot, from_slot, max_cards):
+        """
+        Move cards between slots through the game rules, recording the move for history
+        Return the number of cards moved
+        """
+        count = to_slot.receive_from(from_slot, max_cards=max_cards)
+        if count:
+            self._pending.append((self.slots.index(from_slot), self.slots.index(to_slot), count))
+            publish_move(self, self._pending[-1])
+        return count
+
+    def apply_moves(self, group):
+        """Replay recorded moves without rule checks"""
+        for from_index, to_index, count in group:
+            self.slots[to_index].stack.extend(self.slots[from_index].pop_from(-count))
+
+    def peek(self, position):
+        pos, slot = self.get_slot(position)
         try:
-            _focus = slot if slot.toggle() else None
-        except AttributeError:
+            r = slot.area().move(pos)
+            if r.collidepoint(*position):
+                x, y, a, b = *position, *pos
+                relpos = (x - a, y - b)
+                slot.peek_on(relpos)
+                self._peek.append(slot)
+        except (AttributeError, IndexError):  # not a slot, or empty slot
             return False
         else:
             return True
-    else:
-        changed = slot.receive_from(_focus, max_cards=(1 + count_empty(tableau)) * (1 + count_empty(reserve)))
-        print(changed)
-        unfocus()
-        if changed:
-            save_board_state()
+
+    def peek_off(self):
+        resp = len(self._peek) > 0
+        for slot in pop_iter(self._peek):
+            slot.peek_off()
+        return resp
+
+    def save_board_state(self):
+        print('saving state to history')
+        if self.history_current:
+            del self.history_log[len(self.history):]
+            self.history_log.append(self._pending.copy())
+            self.history.append(self.history_current)
+        self._pending.clear()
+        self.history_current = self.board_state()
+        self.history_future.clear()
+        self.schedule_analysis(previous=self.analysed if self.history else None)
+
+    def schedule_analysis(self, previous=None):
+        """Analyse the position on the next analyse_due, once automatic foundation moves are played"""
+        self._analysis_due = (previous,)
+
+    def analyse_due(self):
+        """Run the scheduled analysis ; return True if it ran"""
+        if self._analysis_due is None:
+            return False
+        (previous,), self._analysis_due = self._analysis_due, None
+        self.analyse_position(previous)
+        self.dirty = True
         return True
 
+    def analyse_position(self, previous=None):
+        """Analyse current position for dead ends ; previous -> position it was played from"""
+        if self.analyser is None:
+            return
+        self.analysed = self.position()
+        self.position_analysis = self.analyser.analyse(self.analysed, previous)
+        if self.position_analysis.status in analysis.lost:
+            print(f'warning: {warnings[self.position_analysis.status]} ({self.position_analysis.elapsed * 1000:.1f}ms)')
 
-def count_empty(iterable_slots):
-    return sum(map(lambda x: x.is_empty(), iterable_slots))
+    def board_state(self):
+        return tuple([slot.save() for slot in panel] for panel in self.board)
 
+    def load_board_state(self, state):
+        for panel, saved_panel in zip(self.board, state):
+            for slot, saved_slot in zip(panel, saved_panel):
+                slot.load(saved_slot)
 
-_peek = []
+    def _history_step(self, from_stack, to_stack):
+        try:
+            state = from_stack.pop()  # raises IndexError if no history
+        except IndexError:
+            print('failed history step')
+        else:
+            to_stack.append(self.history_current)
+            self.history_current = state
+            print('load historical state')
+            self.load_board_state(self.history_current)
+            self._pending.clear()
+            self.schedule_analysis()
+            publish_snapshot(self)
+            return True
 
+    def step_forward(self):
+        print(f'before -> past ({len(self.history)}) future ({len(self.history_future)})')
+        resp = self._history_step(from_stack=self.history_future, to_stack=self.history)
+        print(f'after -> past ({len(self.history)}) future ({len(self.history_future)})')
+        return resp
 
-def peek(position):
-    pos, slot = get_slot(position)
-    try:
-        r = slot.area().move(pos)
-        if r.collidepoint(*position):
-            x, y, a, b = *position, *pos
-            relpos = (x - a, y - b)
-            slot.peek_on(relpos)
-            _peek.append(slot)
-    except AttributeError:
+    def step_back(self):
+        print(f'before -> past ({len(self.history)}) future ({len(self.history_future)})')
+        resp = self._history_step(from_stack=self.history, to_stack=self.history_future)
+        print(f'after -> past ({len(self.history)}) future ({len(self.history_future)})')
+        if resp:
+            self.undos += 1
+        return resp
+
+    def auto_finish(self):
+        """Search a winning line in the background within finish_budget seconds, then play it"""
+        if self._finisher is not None or self._finishing is not None:
+            print('auto-finish: already running')
+            return False
+        rules = self.rules.solver
+        pos = solver.position(self.position())
+        cache = self.solved_cache()
+        known = analysis.cached(cache, pos) if cache is not None else None
+        if known is not None:  # no search
+            thread, result = None, dict(status=known[0], line=known[1], nodes=0, elapsed=0, proven=())
+        else:
+            result = dict(proven=[])
+
+            def search():
+                start = perf_counter()
+                result['status'], result['line'], result['nodes'] = solver.search(
+                    pos, deadline=start + finish_budget, proven=result['proven'], rules=rules)
+                result['elapsed'] = perf_counter() - start
+
+            thread = threading.Thread(target=search, name='auto-finish', daemon=True)
+            thread.start()
+        self._finisher = pos, thread, result
+        delay(action=self._finish, key=('finish', id(self)), delay=finish_poll)
+        return False
+
+    def _finish(self):
+        """Wait for the auto-finish search, then start playing its line"""
+        pos, thread, result = self._finisher
+        if thread is not None and thread.is_alive():
+            delay(action=self._finish, key=('finish', id(self)), delay=finish_poll)
+            return
+        self._finisher = None
+        status, line, nodes, elapsed = result['status'], result['line'], result['nodes'], result['elapsed']
+        cache = self.solved_cache()
+        if thread is not None and cache is not None:
+            analysis.remember(cache, pos, status, line, result['proven'])
+        if status != 'won':
+            reason = 'position is lost' if status == 'lost' else f'no solution within {finish_budget}s'
+            print(f'auto-finish: {reason} ({nodes} nodes in {elapsed:.2f}s)')
+            return
+        if solver.position(self.position()) != pos:
+            print('auto-finish: position changed during search')
+            return
+        print(f'auto-finish: {len(line)} moves found in {elapsed:.2f}s ({nodes} nodes)')
+        if not line:
+            return
+        self.unfocus()
+        if self.analyser is not None:
+            self.analyser.remember_line(pos, line)  # positions ahead need no search
+        self._finishing = deque(line), pos
+        delay(action=self._finish_step, key=('finish', id(self)), delay=finish_step)
+
+    def _finish_step(self):
+        """Play the next move of the auto-finish line as one history state, unless the player changed the board"""
+        if self._finishing is None:  # stopped by a new deal
+            return
+        line, expected = self._finishing
+        self._finishing = None
+        if solver.position(self.position()) != expected:
+            print('auto-finish: position changed, stopped')
+            return
+        f, t, n = move = line.popleft()
+        if self.move(self.slots[t], self.slots[f], max_cards=n) != n:
+            print(f'auto-finish: move {f},{t},{n} refused')
+            return
+        self.save_board_state()
+        self.dirty = True
+        if line:
+            self._finishing = line, solver.apply(expected, move)
+            delay(action=self._finish_step, key=('finish', id(self)), delay=finish_step)
+
+    def save_game(self, path=None):
+        """Save deal, undo/redo history and current state ; see savegame"""
+        if not self.standard('saving'):
+            return False
+        path = path or save_path
+        savegame.save(path, self.deal, self.history_log, depth=len(self.history), pending=self._pending)
+        print(f'game saved to {path}')
         return False
-    else:
+
+    def load_game(self, path=None):
+        """Load game saved by save_game, replaying its history"""
+        if not self.standard('loading'):
+            return False
+        path = path or save_path
+        try:
+            deal, log, depth, pending = savegame.load(path)
+        except (OSError, ValueError) as e:
+            print(f'failed loading game: {e}')
+            return False
+        self.unfocus()
+        self.deal_cards(deal)
+        states = [self.board_state()]
+        for group in log:
+            self.apply_moves(group)
+            states.append(self.board_state())
+        self.history_log[:] = log
+        self.history = deque(states[:depth])
+        self.history_current = states[depth]
+        self.history_future = deque(reversed(states[depth + 1:]))
+        self.load_board_state(self.history_current)
+        self.apply_moves(pending)
+        self._pending[:] = pending
+        self.schedule_analysis()
+        publish_snapshot(self)
+        print(f'game loaded from {path}')
         return True
 
+    def move_log(self):
+        """Return tuple(deal_number, moves) where moves lead from the deal to the current state"""
+        moves = list(chain(*self.history_log[:len(self.history)], self._pending))
+        return self.deal_number, moves
+
+    def record_move_log(self):
+        """Append the current game move log to move_log_path ; see replay"""
+        if not self.standard('move log'):
+            return
+        if self.deal_number is None:
+            print('cannot record move log of an unnumbered deal')
+            return
+        with open(move_log_path, 'a') as f:
+            f.write(replay.format_log(*self.move_log()) + '\n')
+
+    def position(self):
+        """Return current position as card ids per slot"""
+        return [[c.id for c in slot] for slot in self.slots]
+
+    def solved_cache(self):
+        """Return the shared solved-position cache, None for variants it cannot hold"""
+        return solved_cache() if self.variant == variants.freecell else None
+
+    def lookup_position(self):
+        """
+        Return solvecache.Solved(solvable, distance, move) for the current position,
+        None if the position is unknown
+        """
+        cache = self.solved_cache()
+        return None if cache is None else cache.get(self.position())
+
+    def archive_game(self):
+        """Append current game to the archive of finished games"""
+        if not self.standard('archiving'):
+            return
+        index = savegame.Archive(archive_path).append_game(self.deal, self.history_log,
+                                                           depth=len(self.history), pending=self._pending)
+        print(f'game archived as #{index}')
+
+    def get_slot(self, position):
+        """
+        position -> pixels relative to the table origin
+        Return tuple(slot_origin, slot) for the first slot that collide with position
+        Raises ValueError if no slot collide
+        """
+        x, y = position
+        w, h = deck.card_size
+        x, y = x / w, y / h  # convert to percent card_size
+
+        def dist_from(origin):
+            a, b = origin
+            return abs(x - a) + abs(y - b)
+
+        def topleft_quadrant(origin):
+            a, b = origin
+            return a <= x and b <= y
 
-click_handlers = defaultdict(lambda: no_action, {1: click, 3: peek})
+        try:
+            percent_position = sorted(filter(topleft_quadrant, self.slotmap), key=dist_from)[0]
+        except IndexError:
+            raise ValueError('No slot collides')
+        else:
+            ax, ay = percent_position
+            pos, slot = (ax * w, ay * h), self.slotmap[percent_position]
+            if slot.area().move(*pos).collidepoint(*position):
+                return pos, slot
+            else:
+                raise ValueError('No slot collides')
+
+    def push_to_foundation(self):
+        if self._finishing is not None:  # auto-finish plays its own line
+            return False
+        r = reduce(operator.or_, (bool(self.move(fnd, tab, max_cards=1)) for tab in self.tableau for fnd in self.foundation), False)
+        print(f'foundation push={r} score={self.score()}')
+        self.dirty |= r
+        return r
+
+    def score(self):
+        return sum(map(len, self.foundation))
+
+    def win_condition(self):
+        return self.score() == len(deck.deck)
+
+    def rect(self):
+        return pygame.Rect(self.origin, self.size)
+
+    def render(self, screen):
+        """Draw table on screen ; return the drawn rect"""
+        rect = self.rect()
+        screen.fill(deck.Colors.green, rect)
+        w, h = deck.card_size
+        ox, oy = self.origin
+        for relativePosition, slot in self.slotmap.items():
+            i, j = relativePosition  # relative %
+            position = ox + int(i * w), oy + int(j * h)  # absolute pixels
+            screen.blit(slot.render(), position, slot.area())
+        if self.position_analysis is not None and self.position_analysis.status in warnings and deck.font is not None:
+            deck.font.render_to(screen, (ox + w // 10, rect.bottom - h // 3), warnings[self.position_analysis.status],
+                                size=h // 6, fgcolor=deck.Colors.gold)
+        self.dirty = False
+        return rect
+
+
+def table_at(position):
+    """Return tuple(table, position relative to the table) ; raises ValueError if none"""
+    for table in tables:
+        if table.rect().collidepoint(*position):
+            x, y = table.origin
+            return table, (position[0] - x, position[1] - y)
+    raise ValueError('No table collides')
+
+
+def activate(table):
+    """Make table the target of key handlers, the module game"""
+    global game
+    if table is not game:
+        game.unfocus()
+        game.dirty = True
+        game = table
 
 
-def on_click(event):
-    try:
-        return click_handlers[event.button](event.pos)
-    except ValueError:
-        return unfocus()
+def click(position):
+    table, position = table_at(position)
+    activate(table)
+    table.dirty |= table.click(position)
+    return True
 
 
-def save_board_state():
-    print('saving state to history')
-    global history, history_current, history_future
-    if history_current:
-        history.append(history_current)
-    history_current = tuple([slot.save() for slot in panel] for panel in board)
-    history_future.clear()
+def peek(position):
+    table, position = table_at(position)
+    resp = table.peek(position)
+    table.dirty |= resp
+    return resp
+
 
+click_handlers = defaultdict(lambda: no_action, {1: click, 3: peek})
 
-def _history_step(from_stack, to_stack):
-    global board, history_current
+
+def on_click(event):
     try:
-        state = from_stack.pop()  # raises IndexError if no history
-    except IndexError:
-        print('failed history step')
-    else:
-        to_stack.append(history_current)
-        history_current = state
-        print('load historical state')
-        for panel, saved_panel in zip(board, history_current):
-            for slot, saved_slot in zip(panel, saved_panel):
-                slot.load(saved_slot)
-        return True
+        return click_handlers[event.button](event.pos)
+    except ValueError:
+        game.dirty = True
+        return game.unfocus()
 
 
-def step_forward():
-    global history, history_future
-    print(f'before -> past ({len(history)}) future ({len(history_future)})')
-    resp = _history_step(from_stack=history_future, to_stack=history)
-    print(f'after -> past ({len(history)}) future ({len(history_future)})')
-    return resp
+def on_key(action):
+    def handler():
+        resp = action(game)
+        game.dirty |= bool(resp)
+        return resp
+    return handler
 
 
-def step_back():
-    global history, history_future
-    print(f'before -> past ({len(history)}) future ({len(history_future)})')
-    resp = _history_step(from_stack=history, to_stack=history_future)
-    print(f'after -> past ({len(history)}) future ({len(history_future)})')
-    return resp
+def next_theme():
+    """Switch card faces to the next theme, procedural drawing included"""
+    deck.set_theme(themes[(themes.index(deck.theme) + 1) % len(themes)])
+    for table in tables:
+        table.dirty = True
+    return True
 
 
-key_handlers = defaultdict(lambda: no_action, {'-': step_back, '+': step_forward})
+key_handlers = defaultdict(lambda: no_action, {'-': on_key(Game.step_back), '+': on_key(Game.step_forward),
+                                               's': on_key(Game.save_game), 'l': on_key(Game.load_game),
+                                               't': next_theme, 'a': on_key(Game.auto_finish),
+                                               'i': lambda: toggle_stats()})
 
 
 def on_keydown(event):
@@ -143,20 +559,35 @@ def pop_iter(stack):
         while True:
             yield stack.pop()
     except IndexError:
-        raise StopIteration()
+        return
 
 
 def on_click_release(event):
     if event.button == 3:  # turn peek off
-        resp = len(_peek) > 0
-        for slot in pop_iter(_peek):
-            slot.peek_off()
+        resp = False
+        for table in tables:
+            changed = table.peek_off()
+            table.dirty |= changed
+            resp |= changed
         return resp
 
 
+def grid_size(n):
+    """Return tuple(columns, rows) of a grid of n tables"""
+    cols = ceil(sqrt(n))
+    return cols, ceil(n / cols)
+
+
 def resize(screensize):
     pygame.display.set_mode(screensize, RESIZABLE)
-    return deck.set_size(screensize, cols=8, rows=3.5, margin=margin * screensize[0])  # init board
+    cols, rows = grid_size(len(tables))
+    tw, th = screensize[0] // cols, screensize[1] // rows
+    for k, table in enumerate(tables):
+        table.origin = (tw * (k % cols), th * (k // cols))
+        table.size = (tw, th)
+        table.dirty = True
+    cols = max(table.columns() for table in tables)
+    return deck.set_size((tw, th), cols=cols, rows=3.5, margin=margin * tw)  # init board
 
 
 def no_action(*a):
@@ -179,123 +610,228 @@ handlers = defaultdict(lambda: no_action, {KEYDOWN: on_keydown,
                                            MOUSEBUTTONUP: on_click_release})
 
 
-def process_events():
-    return reduce(operator.or_, (bool(handlers[event.type](event)) for event in pygame.event.get()), False)
+def process_events(events=None):
+    """
+    Handle events, from the pygame queue by default
+    Return True if display needs refresh
+    """
+    if events is None:
+        events = pygame.event.get()
+    if recorder is not None:
+        recorder.record(events)
+    return reduce(operator.or_, (bool(handlers[event.type](event)) for event in events), False)
 
 
-def process_differed_events():
+def process_differed_events(force=False):
+    """Run due differed actions, or all of them if force"""
     change = False
     for k in list(_differed):
         _differed_delay[k] -= 1
-        if _differed_delay[k] <= 0:
-            _differed[k]()
-            del _differed[k]
+        if _differed_delay[k] <= 0 or force:
+            action = _differed.pop(k)
             del _differed_delay[k]
+            action()  # may delay itself again
             change = True
     return change
 
 
-reserve = [ReserveSlot() for i in range(4)]
-foundation = [FoundationSlot() for i in range(4)]
-tableau = [TableauSlot() for i in range(8)]
-board = (reserve, foundation, tableau)
-margin = 0.01  # % screen_width
-slotmap = {}  # position -> slot  where position is in percent card_size
+recorder = None  # eventlog.Recorder while recording
+spectators = None  # spectate.SpectatorServer while serving
+themes = [None]  # card themes cycled through, None for procedural drawing
+finish_budget = 5.0  # seconds of auto-finish search
+finish_poll = 1000  # main loop iterations between auto-finish search checks
+finish_step = 10000  # main loop iterations between auto-finish moves
+stats_path = 'freecell.db'
+stats_writer = None  # stats.Writer while playing
+_stats_db = None  # stats screen connection
+show_stats = False
+margin = 0.01  # % table width
+game = Game()  # active table
+tables = [game]
+save_path = 'freecell.sav'
+archive_path = 'freecell.fca'
+move_log_path = 'freecell.log'
+cache_path = 'freecell.cache'
+_cache = None
+warnings = {'no moves': 'No moves left', 'lost': 'Lost position'}
 
-history = deque()
-history_current = None
-history_future = deque()
 
+def solved_cache():
+    """Return the shared solved-position cache, opened on first use"""
+    global _cache
+    if _cache is None:
+        _cache = solvecache.SolvedCache(cache_path)
+    return _cache
 
-def get_slot(position):
-    """
-    Return tuple(slot_origin, slot) for the first slot that collide with position
-    Raises ValueError if no slot collide
-    """
-    x, y = position
-    w, h = deck.card_size
-    x, y = x / w, y / h  # convert to percent card_size
 
-    def dist_from(origin):
-        a, b = origin
-        return abs(x - a) + abs(y - b)
+def publish_move(table, move):
+    if spectators is not None and table in tables:
+        spectators.move(tables.index(table), move)
 
-    def topleft_quadrant(origin):
-        a, b = origin
-        return a <= x and b <= y
 
-    try:
-        percent_position = sorted(filter(topleft_quadrant, slotmap), key=dist_from)[0]
-    except IndexError:
-        raise ValueError('No slot collides')
-    else:
-        ax, ay = percent_position
-        pos, slot = (ax * w, ay * h), slotmap[percent_position]
-        if slot.area().move(*pos).collidepoint(*position):
-            return pos, slot
-        else:
-            raise ValueError('No slot collides')
+def publish_snapshot(table):
+    if spectators is not None and table in tables:
+        spectators.snapshot(tables.index(table), table.deal_number, table.position())
 
 
 def push_to_foundation():
-    r = reduce(operator.or_, (bool(fnd.receive_from(tab, max_cards=1)) for tab in tableau for fnd in foundation), False)
-    print(f'foundation push={r} score={score()}')
+    return reduce(operator.or_, [table.push_to_foundation() for table in tables], False)
 
 
-def score():
-    return sum(map(len, foundation))
+def win_condition():
+    return all(table.win_condition() for table in tables)
 
 
-def win_condition():
-    return score() == len(deck.deck)
+def analyse_tables():
+    """Analyse positions of tables saved since last call ; after push_to_foundation, so warnings match the board"""
+    return reduce(operator.or_, [table.analyse_due() for table in tables], False)
 
 
-def refresh_display():
-    screen = pygame.display.get_surface()
-    screen.fill(deck.Colors.green)
-    w, h = deck.card_size
-    for relativePosition, slot in slotmap.items():
-        i, j = relativePosition  # relative %
-        position = int(i * w), int(j * h)  # absolute pixels
-        screen.blit(slot.render(), position, slot.area())
-    pygame.display.flip()
+def finish_tables():
+    """Archive and log tables that just won"""
+    for table in tables:
+        if not table.finished and table.win_condition():
+            table.finished = True
+            print(f'Congrats ! table {tables.index(table)}, deal {table.deal_number}')
+            table.archive_game()
+            table.record_move_log()
+            table.record_stats(won=True)
 
 
-def init():
+def refresh_display():
+    """Redraw changed tables only"""
+    screen = pygame.display.get_surface()
+    rects = [table.render(screen) for table in tables if table.dirty]
+    if rects and show_stats:
+        rects.append(render_stats(screen))
+    if rects:
+        pygame.display.update(rects)
+
+
+def toggle_stats():
+    global show_stats
+    show_stats ^= True
+    for table in tables:
+        table.dirty = True
+    return True
+
+
+def render_stats(screen):
+    """Draw the statistics screen over the tables ; return the drawn rect"""
+    global _stats_db
+    if _stats_db is None:
+        _stats_db = stats.connect(stats_path)
+    rect = screen.get_rect().inflate(-screen.get_width() // 5, -screen.get_height() // 5)
+    screen.blit(deck.shade(rect.size, deck.Colors.black, 200), rect)
+    if deck.font is not None:
+        size = max(12, rect.h // 16)
+        for k, line in enumerate(stats.lines(_stats_db)):
+            deck.font.render_to(screen, (rect.x + size, rect.y + size + k * 3 * size // 2), line,
+                                size=size, fgcolor=deck.Colors.white)
+    return rect
+
+
+def init(number=None, n_tables=1, variant=variants.freecell):
+    """
+    number -> deal number of the first table, following tables get the next numbers ; random if None
+    variant -> rules of every table ; see variants
+    """
+    global game
     pygame.init()
-    screensize = (640, 480)
+    if number is None:
+        number = random.randint(1, 1000000)  # one number replays every table ; see eventlog
+    tables[:] = [table if table.variant == variant else Game(variant=variant) for table in tables[:n_tables]]
+    while len(tables) < n_tables:
+        tables.append(Game(variant=variant))
+    game = tables[0]
+    cols, rows = grid_size(n_tables)
+    scale = min(1, 1600 / (640 * cols), 900 / (480 * rows))
+    screensize = (int(640 * cols * scale), int(480 * rows * scale))
     w, h = resize(screensize)
     # filter events
     pygame.event.set_allowed(list(handlers))
     # init deck
-    m = margin * screensize[0] / w  # % card_width
-    for k, slot in enumerate(chain(*board)):
-        relativePosition = (m + (1 + m) * (k % 8), m + (1 + m) * (k // 8))
-        slotmap[relativePosition] = slot
-    # deal cards
-    deck.shuffle()
-    for card, slot in zip(deck.deck, cycle(tableau)):
-        slot.stack.append(card)
-    # init history+
-    save_board_state()
+    m = margin * tables[0].size[0] / w  # % card_width
+    for k, table in enumerate(tables):
+        if table.analyser is not None:
+            table.analyser.cache = table.solved_cache()
+        table.layout(m)
+        table.new_deal(number + k)
+    analyse_tables()
     refresh_display()
 
 
-def main():
-    init()
+def main(number=None, record=None, n_tables=1, spectate_address=None, theme_paths=(), variant=variants.freecell):
+    """
+    number -> deal number, random if None
+    record -> path to record handled events to ; see eventlog
+    n_tables -> number of independent tables in the window
+    spectate_address -> 'host:port' or Unix socket path to stream games to ; see spectate
+    theme_paths -> card themes, the first one in use ; see theme
+    variant -> rules of the tables ; see variants
+    """
+    global recorder, spectators, stats_writer
+    stats_writer = stats.Writer(stats_path)
+    del themes[1:]
+    for path in theme_paths:
+        try:
+            themes.append(theme.Theme(path))  # decoding starts in the background
+        except ValueError as e:
+            print(f'skipping theme: {e}')
+    deck.set_theme(themes[1] if len(themes) > 1 else None)
+    if spectate_address:
+        try:
+            spectators = spectate.SpectatorServer(spectate_address).start()
+            print(f'spectators on {spectators.address}')
+        except OSError as e:
+            print(f'not streaming to spectators: {e}')
+    init(number, n_tables, variant)
+    if record:
+        recorder = eventlog.Recorder(record, game.deal_number, pygame.display.get_surface().get_size(), n_tables,
+                                     variant)
     try:
         while not win_condition():
             pygame.event.pump()
             if process_events() or process_differed_events():
                 push_to_foundation()
+                finish_tables()
+                analyse_tables()
                 refresh_display()
         else:
             print('Congrats !')
     except EOFError:  # Quit
         pass
     finally:
+        for table in tables:
+            if not table.finished:
+                table.record_stats(won=False)  # abandoned
+        stats_writer.close()
+        stats_writer = None
+        if recorder is not None:
+            recorder.close()
+            recorder = None
+        if spectators is not None:
+            spectators.close()
+            spectators = None
         pygame.quit()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='FreeCell')
+    parser.add_argument('--deal', type=int, default=None, help='deal number')
+    parser.add_argument('--tables', type=int, default=1, help='number of tables in the window')
+    parser.add_argument('--record', default=None, help='record handled events to file')
+    parser.add_argument('--spectate', default=None, help="stream games to spectators on 'host:port' or Unix socket path")
+    parser.add_argument('--theme', action='append', default=[], help="card images directory or sprite sheet, 't' cycles themes")
+    parser.add_argument('--variant', choices=variants.variants, default='freecell', help='rules of the game')
+    parser.add_argument('--cells', type=int, default=None, help='number of reserve cells of the variant')
+    parser.add_argument('--cascades', type=int, default=None, help='number of tableau cascades of the variant')
+    args = parser.parse_args()
+    variant = variants.variants[args.variant]
+    try:
+        variant = variants.custom(variant, cells=variant.cells if args.cells is None else args.cells,
+                                  cascades=variant.cascades if args.cascades is None else args.cascades)
+    except ValueError as e:
+        parser.error(str(e))
+    main(args.deal, record=args.record, n_tables=args.tables, spectate_address=args.spectate, theme_paths=args.theme,
+         variant=variant)
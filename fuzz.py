@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Randomised stress harness of the move rules, headless.
+
+Plays random legal and illegal moves through Game.move and Slot.put on numbered
+deals, and checks after every step that:
+    the 52 cards are all on the board, once
+    foundations hold same suit runs from the Ace
+    reserve cells hold at most one card
+    tableau cards above the dealt ones alternate colors in descending order
+    rejected puts leave the slot untouched
+    step_back then step_forward restore the positions around a move
+Reports the speed of the rules alone, Game.move and Slot.put calls, to follow rule
+changes, apart from the harness throughput, mostly spent picking moves and checking.
+"""
+import os
+import sys
+import random
+import argparse
+from contextlib import redirect_stdout
+from time import perf_counter
+import deck
+import solver
+from freecell import Game, count_empty
+
+
+class Failure(AssertionError):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise Failure(message)
+
+
+def check_board(game, columns):
+    """
+    columns -> dealt card ids of each tableau column
+    Raises Failure if the board breaks an invariant
+    """
+    pos = game.position()
+    ids = [c for stack in pos for c in stack]
+    if len(ids) != 52 or len(set(ids)) != 52:
+        raise Failure(f'cards not conserved: {len(ids)} cards, {len(set(ids))} distinct')
+    for k in solver.reserve:
+        if len(pos[k]) > 1:
+            raise Failure(f'reserve cell holds {len(pos[k])} cards')
+    for k in solver.foundation:
+        stack = pos[k]
+        if stack and (solver.number(stack[0]) != 1 or stack != list(range(stack[0], stack[0] + len(stack)))):
+            raise Failure(f'foundation out of order: {stack}')
+    for k, dealt in zip(solver.tableau, columns):
+        stack = pos[k]
+        j = 0
+        while j < len(stack) and j < len(dealt) and stack[j] == dealt[j]:
+            j += 1
+        for i in range(max(j, 1), len(stack)):
+            below, card = stack[i - 1], stack[i]
+            if solver.number(card) != solver.number(below) - 1 or solver.color(card) == solver.color(below):
+                raise Failure(f'card {card} stacked on {below} in {stack}')
+
+
+def random_move(game, rng, legal_ratio):
+    """Return tuple(to slot, from slot, max cards), legal moves picked with legal_ratio probability"""
+    if rng.random() < legal_ratio:
+        moves = solver.moves(solver.position(game.position()))
+        if moves:
+            f, t, n = rng.choice(moves)
+            return game.slots[t], game.slots[f], (1 + count_empty(game.tableau)) * (1 + count_empty(game.reserve))
+    return rng.choice(game.slots), rng.choice(game.slots), rng.randint(1, 13)
+
+
+def random_put(game, rng):
+    """
+    Put cards copied from a slot on another one, checking rejected puts revert and accepted ones pop back
+    Return seconds spent in Slot.put
+    """
+    source, target = rng.choice(game.slots), rng.choice(game.slots)
+    if not len(source):
+        return 0
+    cards = source[-rng.randint(1, len(source)):]
+    cards = cards[0] if len(cards) == 1 and rng.random() < 0.5 else cards
+    before = target.save()
+    start = perf_counter()
+    try:
+        target.put(cards)
+    except ValueError:
+        elapsed = perf_counter() - start
+        check(target.stack == before, 'rejected put changed the slot')
+    else:
+        elapsed = perf_counter() - start
+        target.pop_from(len(before))
+        check(target.stack == before, 'pop_from did not restore the slot')
+    return elapsed
+
+
+def fuzz(steps, seed=0, legal_ratio=0.5, undo_ratio=0.1, game_length=400):
+    """
+    Play steps random moves, new deals every game_length moves
+    Return dict of counters, rules -> seconds spent in Game.move and Slot.put ;
+    raises Failure on the first broken invariant
+    """
+    rng = random.Random(seed)
+    game = Game(analyse=False)
+    stats = dict(moves=0, played=0, puts=0, undos=0, deals=0, rules=0.0)
+    while stats['moves'] < steps:
+        number = rng.randint(1, 1000000)
+        game.new_deal(number)
+        columns = [deck.deal(number)[k::8] for k in range(8)]
+        stats['deals'] += 1
+        for _ in range(game_length):
+            before = game.position()
+            to_slot, from_slot, max_cards = random_move(game, rng, legal_ratio)
+            start = perf_counter()
+            count = game.move(to_slot, from_slot, max_cards)
+            stats['rules'] += perf_counter() - start
+            stats['moves'] += 1
+            if count:
+                stats['played'] += 1
+                game.save_board_state()
+                if rng.random() < undo_ratio:
+                    after = game.position()
+                    check(game.step_back(), 'step_back failed')
+                    check(game.position() == before, 'step_back did not restore the position')
+                    check(game.step_forward(), 'step_forward failed')
+                    check(game.position() == after, 'step_forward did not restore the position')
+                    stats['undos'] += 1
+            else:
+                check(game.position() == before, 'refused move changed the board')
+            if rng.random() < 0.2:
+                stats['rules'] += random_put(game, rng)
+                stats['puts'] += 1
+            check_board(game, columns)
+            if stats['moves'] >= steps:
+                break
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress the move rules with random moves')
+    parser.add_argument('--steps', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legal', type=float, default=0.5, help='ratio of legal moves')
+    args = parser.parse_args()
+    start = perf_counter()
+    try:
+        with open(os.devnull, 'w') as null, redirect_stdout(null):  # game logs
+            stats = fuzz(args.steps, seed=args.seed, legal_ratio=args.legal)
+    except Failure as e:
+        print(f'invariant broken: {e}')
+        sys.exit(1)
+    elapsed = perf_counter() - start
+    calls = stats['moves'] + stats['puts']
+    print(f"{stats['moves']} moves ({stats['played']} played, {stats['undos']} undo/redo checks, "
+          f"{stats['puts']} puts) on {stats['deals']} deals")
+    print(f"rules: {calls} move and put calls in {stats['rules']:.2f}s: {calls / stats['rules']:.0f} calls/s")
+    print(f"harness: {elapsed:.2f}s: {stats['moves'] / elapsed:.0f} moves/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Move log replay and verification.
+
+A move log is a text line per game: the deal number followed by moves 'from,to,count'
+where from/to index the 16 board slots (reserve, foundation, tableau) as freecell.Game.slots.
+Logs are verified headless through the board rules (receive_from/put_single),
+or replayed in real time with the UI.
+"""
+import deck
+from board import ReserveSlot, FoundationSlot, TableauSlot
+from itertools import cycle
+from multiprocessing import Pool
+from time import perf_counter, sleep
+import argparse
+import sys
+
+
+def format_log(deal_number, moves):
+    return ' '.join([str(deal_number)] + [f'{f},{t},{n}' for f, t, n in moves])
+
+
+def parse_log(line):
+    """
+    Return tuple(deal_number, moves)
+    Raises ValueError on malformed line
+    """
+    number, *moves = line.split()
+    return int(number), [tuple(map(int, m.split(','))) for m in moves]
+
+
+def new_board(deal_number):
+    """Return tuple(reserve, foundation, tableau) with deal_number dealt"""
+    reserve = [ReserveSlot() for i in range(4)]
+    foundation = [FoundationSlot() for i in range(4)]
+    tableau = [TableauSlot() for i in range(8)]
+    for card_id, slot in zip(deck.deal(deal_number), cycle(tableau)):
+        slot.stack.append(deck.cards[card_id])
+    return reserve, foundation, tableau
+
+
+def check_move(board, move):
+    """
+    Play move on board through the game rules
+    Raises ValueError if the move is illegal, leaving board untouched
+    """
+    reserve, foundation, tableau = board
+    f, t, n = move
+    slots = reserve + foundation + tableau
+    if not (0 <= f < 16 and 0 <= t < 16) or f == t or 4 <= f < 8:
+        raise ValueError(f'no such move {move}')
+    limit = (1 + sum(s.is_empty() for s in tableau)) * (1 + sum(s.is_empty() for s in reserve))
+    if n > limit:
+        raise ValueError(f'move {move} exceeds {limit} cards')
+    if not 0 < n <= len(slots[f]):
+        raise ValueError(f'move {move} exceeds source slot')
+    slots[t].put(slots[f][-n:])  # same rules as receive_from, board untouched if illegal
+    slots[f].pop_from(-n)
+
+
+def verify(deal_number, moves):
+    """
+    Replay moves headless from deal_number
+    Return True if the game ends won
+    Raises ValueError on the first illegal move
+    """
+    board = new_board(deal_number)
+    for k, move in enumerate(moves):
+        try:
+            check_move(board, move)
+        except ValueError as e:
+            raise ValueError(f'deal {deal_number} move #{k}: {e}')
+    return sum(map(len, board[1])) == len(deck.cards)
+
+
+def verify_line(line):
+    """Return tuple(line, won, error message or None)"""
+    try:
+        return line, verify(*parse_log(line)), None
+    except ValueError as e:
+        return line, False, str(e)
+
+
+def verify_all(lines, processes=None, chunksize=64):
+    """Verify many logs in a process pool ; yield verify_line results"""
+    with Pool(processes) as pool:
+        yield from pool.imap(verify_line, lines, chunksize=chunksize)
+
+
+def play(deal_number, moves, delay=0.3):
+    """Replay moves in real time with the UI"""
+    import freecell
+    import pygame
+    freecell.init(deal_number)
+    try:
+        for move in moves:
+            if pygame.event.get(pygame.QUIT):
+                return
+            f, t, n = move
+            game = freecell.game
+            if game.move(game.slots[t], game.slots[f], max_cards=n) != n:
+                print(f'illegal move {move}')
+                return
+            game.save_board_state()
+            freecell.analyse_tables()
+            freecell.refresh_display()
+            sleep(delay)
+        print('won' if freecell.win_condition() else 'not won')
+        while not pygame.event.get([pygame.QUIT, pygame.KEYDOWN]):
+            sleep(0.01)
+    finally:
+        pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('logs', nargs='+', help='move log files, one game per line')
+    parser.add_argument('--play', action='store_true', help='replay the first log with the UI')
+    parser.add_argument('--delay', type=float, default=0.3, help='seconds between moves with --play')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes for verification')
+    args = parser.parse_args()
+    lines = []
+    for path in args.logs:
+        with open(path) as f:
+            lines += [line for line in map(str.strip, f) if line]
+    if args.play:
+        play(*parse_log(lines[0]), delay=args.delay)
+        return
+    start = perf_counter()
+    won = failed = 0
+    for line, win, error in verify_all(lines, processes=args.processes):
+        won += win
+        if error:
+            failed += 1
+            print(error)
+    elapsed = perf_counter() - start
+    print(f'{len(lines)} logs: {won} won, {failed} illegal, '
+          f'{len(lines) - won - failed} unfinished in {elapsed:.2f}s ({len(lines) / elapsed:.0f} logs/s)')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Compact binary save-game format and append-only game archive.
+
+Game layout (all integers are unsigned LEB128 varints):
+    magic 'FCS1'
+    deal: 52 bytes, one card id (0-51) per byte, in dealing order
+    depth: number of history steps applied to reach the current state
+    pending: move group played since the last saved state
+    log: number of move groups, then each group (past and future timeline)
+Move group: number of moves, then one varint per move: count << 8 | from << 4 | to
+where from/to index the 16 board slots (reserve, foundation, tableau).
+
+Archive: data file of length-prefixed games, and an index file (path + '.idx')
+of little-endian uint64 offsets, one per game, fetched through mmap.
+"""
+import mmap
+import os
+import struct
+
+magic = b'FCS1'
+offset_format = struct.Struct('<Q')
+
+
+def encode_varint(n, out):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def decode_varint(data, pos):
+    """Return tuple(value, next position)"""
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def encode_move(from_index, to_index, count):
+    return count << 8 | from_index << 4 | to_index
+
+
+def decode_move(n):
+    """Return tuple(from_index, to_index, count)"""
+    return (n >> 4) & 0xF, n & 0xF, n >> 8
+
+
+def _encode_group(group, out):
+    encode_varint(len(group), out)
+    for move in group:
+        encode_varint(encode_move(*move), out)
+
+
+def _decode_group(data, pos):
+    n, pos = decode_varint(data, pos)
+    group = []
+    for _ in range(n):
+        m, pos = decode_varint(data, pos)
+        group.append(decode_move(m))
+    return group, pos
+
+
+def _check_group(group, heights):
+    """Replay group on slot heights ; raises ValueError on moves the board cannot hold"""
+    for from_index, to_index, count in group:
+        if (from_index == to_index or not 1 <= count <= heights[from_index]
+                or to_index < 4 and (count != 1 or heights[to_index])):
+            raise ValueError(f'invalid move {from_index},{to_index},{count} in save-game')
+        heights[from_index] -= count
+        heights[to_index] += count
+
+
+def dumps(deal, log, depth=None, pending=()):
+    """
+    deal -> sequence of 52 card ids
+    log -> sequence of move groups, each a sequence of (from, to, count)
+    depth -> current position in log, defaults to the end of log
+    pending -> move group played after the current history step
+    """
+    if depth is None:
+        depth = len(log)
+    if len(deal) != 52:
+        raise ValueError(f'deal must hold 52 cards, got {len(deal)}')
+    out = bytearray(magic)
+    out += bytes(deal)
+    encode_varint(depth, out)
+    _encode_group(pending, out)
+    encode_varint(len(log), out)
+    for group in log:
+        _encode_group(group, out)
+    return bytes(out)
+
+
+def loads(data):
+    """
+    Return tuple(deal, log, depth, pending) ; see dumps
+    Raises ValueError on malformed data
+    """
+    if bytes(data[:4]) != magic:
+        raise ValueError('not a freecell save-game')
+    try:
+        deal = tuple(data[4:56])
+        depth, pos = decode_varint(data, 56)
+        pending, pos = _decode_group(data, pos)
+        n, pos = decode_varint(data, pos)
+        log = []
+        for _ in range(n):
+            group, pos = _decode_group(data, pos)
+            log.append(group)
+    except IndexError:
+        raise ValueError('truncated save-game')
+    if sorted(deal) != list(range(52)) or depth > len(log):
+        raise ValueError('corrupted save-game')
+    heights = [0] * 8 + [len(deal[k::8]) for k in range(8)]
+    for k, group in enumerate(log):
+        if k == depth:
+            current = heights.copy()
+        _check_group(group, heights)
+    _check_group(pending, heights if depth == len(log) else current)
+    return deal, log, depth, pending
+
+
+def save(path, *args, **kwargs):
+    with open(path, 'wb') as f:
+        f.write(dumps(*args, **kwargs))
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+class Archive(object):
+    """
+    Append-only archive of many games, fetched by index without parsing the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.index_path) // offset_format.size
+        except OSError:
+            return 0
+
+    def append(self, data):
+        """Append encoded game ; return its index"""
+        with open(self.path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(encode_varint(len(data), bytearray()))
+            f.write(data)
+        with open(self.index_path, 'ab') as f:
+            f.write(offset_format.pack(offset))
+        return len(self) - 1
+
+    def append_game(self, *args, **kwargs):
+        return self.append(dumps(*args, **kwargs))
+
+    def __getitem__(self, index):
+        """Return encoded game at index"""
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('archive index out of range')
+        with open(self.index_path, 'rb') as f:
+            f.seek(index * offset_format.size)
+            offset, = offset_format.unpack(f.read(offset_format.size))
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            size, pos = decode_varint(m, offset)
+            return m[pos:pos + size]
+
+    def game(self, index):
+        """Return decoded game at index ; see loads"""
+        return loads(self[index])
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
@@ -0,0 +1,180 @@
+"""
+Persistent solved-position cache: a memory-mapped hash table shared across processes.
+
+Positions are keyed by a 64 bits hash of their canonical state, where the order of
+reserve cells, foundations and tableau columns does not matter. Entries store
+solvability, distance to win and best move, and are evicted least recently used
+within their bucket of ways entries.
+
+Positions are given as 16 sequences of card ids, slots ordered as freecell.Game.slots.
+Moves are (from, to, count) in those slots, stored as (card, destination kind, destination card)
+so they apply to any equivalent position.
+"""
+import mmap
+import os
+import struct
+from collections import namedtuple
+from hashlib import blake2b
+try:
+    import fcntl
+except ImportError:  # no inter-process locking
+    fcntl = None
+
+Solved = namedtuple('Solved', ['solvable', 'distance', 'move'])
+
+header = struct.Struct('<4sQQ')  # magic, number of buckets, access clock
+entry = struct.Struct('<QQBHBBBxx')  # key, last used, solvable, distance, move card, kind, destination
+magic = b'FCC1'
+ways = 8
+none = 0xFF
+reserve, foundation, tableau = range(0, 4), range(4, 8), range(8, 16)
+kinds = [reserve, foundation, tableau]
+
+
+def canonical(stacks):
+    """
+    Return canonical bytes of position, independent of slot order within each panel
+    """
+    heights = [0] * 4
+    for k in foundation:
+        if stacks[k]:
+            top = stacks[k][-1]
+            heights[top // 13] = top % 13 + 1
+    cells = sorted(s[-1] if s else none for s in (stacks[k] for k in reserve))
+    columns = sorted(bytes(stacks[k]) for k in tableau)
+    return bytes(heights + cells) + b'\xfe'.join(columns)
+
+
+def position_key(stacks):
+    """Return non zero 64 bits key of position"""
+    return canonical_key(canonical(stacks))
+
+
+def canonical_key(state):
+    """Return non zero 64 bits key of canonical bytes ; see canonical"""
+    key = int.from_bytes(blake2b(state, digest_size=8).digest(), 'little')
+    return key or 1
+
+
+def encode_move(stacks, move):
+    """Return tuple(card, kind, destination card) of move (from, to, count)"""
+    f, t, n = move
+    kind = next(k for k, panel in enumerate(kinds) if t in panel)
+    return stacks[f][-n], kind, stacks[t][-1] if stacks[t] else none
+
+
+def decode_move(stacks, card, kind, dest):
+    """
+    Return move (from, to, count) in position stacks
+    Raises ValueError if the move does not apply to stacks
+    """
+    for f in (*reserve, *tableau):
+        if card in stacks[f]:
+            n = len(stacks[f]) - list(stacks[f]).index(card)
+            break
+    else:
+        raise ValueError(f'card {card} not found')
+    for t in kinds[kind]:
+        top = stacks[t][-1] if stacks[t] else none
+        if t != f and top == dest:
+            return f, t, n
+    raise ValueError(f'no destination for move of card {card}')
+
+
+class SolvedCache(object):
+    """
+    Memory-mapped set associative table ; buckets of ways entries evicted by least recent use
+    """
+
+    def __init__(self, path, capacity=1 << 20):
+        self.path = path
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+b')
+        self._lock()
+        try:
+            if os.path.getsize(path) < header.size:
+                buckets = max(1, capacity // ways)
+                self.file.truncate(header.size + buckets * ways * entry.size)
+                self.file.seek(0)
+                self.file.write(header.pack(magic, buckets, 0))
+                self.file.flush()
+        finally:
+            self._unlock()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        m, self.buckets, _ = header.unpack_from(self.map, 0)
+        if m != magic:
+            raise ValueError(f'{path} is not a solved-position cache')
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def _tick(self):
+        m, buckets, clock = header.unpack_from(self.map, 0)
+        header.pack_into(self.map, 0, m, buckets, clock + 1)
+        return clock + 1
+
+    def _offsets(self, key):
+        base = header.size + (key % self.buckets) * ways * entry.size
+        return range(base, base + ways * entry.size, entry.size)
+
+    def get_key(self, key):
+        """Return tuple(solvable, distance, (card, kind, destination)) or None"""
+        self._lock()
+        try:
+            for offset in self._offsets(key):
+                k, _, solvable, distance, card, kind, dest = entry.unpack_from(self.map, offset)
+                if k == key:
+                    entry.pack_into(self.map, offset, k, self._tick(), solvable, distance, card, kind, dest)
+                    return bool(solvable), distance, (card, kind, dest)
+            return None
+        finally:
+            self._unlock()
+
+    def put_key(self, key, solvable, distance, move):
+        self._lock()
+        try:
+            victim, oldest = None, None
+            for offset in self._offsets(key):
+                k, used, *_ = entry.unpack_from(self.map, offset)
+                if k == key or k == 0:
+                    victim = offset
+                    break
+                if oldest is None or used < oldest:
+                    victim, oldest = offset, used
+            entry.pack_into(self.map, victim, key, self._tick(), bool(solvable), min(distance, 0xFFFF), *move)
+        finally:
+            self._unlock()
+
+    def get(self, stacks):
+        """Return Solved for position stacks, or None if unknown"""
+        resp = self.get_key(position_key(stacks))
+        if resp is None:
+            return None
+        solvable, distance, move = resp
+        try:
+            move = decode_move(stacks, *move) if move[0] != none else None
+        except ValueError:  # hash collision
+            return None
+        return Solved(solvable, distance, move)
+
+    def put(self, stacks, solvable, distance=0, move=None):
+        """Store position stacks ; move -> (from, to, count) best move, None if won or lost"""
+        move = (none,) * 3 if move is None else encode_move(stacks, move)
+        self.put_key(position_key(stacks), solvable, distance, move)
+
+    def put_lost(self, states):
+        """Store positions proven lost, given by canonical bytes ; see canonical"""
+        for state in states:
+            self.put_key(canonical_key(state), False, 0, (none,) * 3)
+
+    def __len__(self):
+        return sum(entry.unpack_from(self.map, header.size + k * entry.size)[0] != 0
+                   for k in range(self.buckets * ways))
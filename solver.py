@@ -0,0 +1,280 @@
+"""
+Pure python FreeCell search over positions.
+
+A position is a tuple of 16 tuples of card ids, slots ordered as freecell.Game.slots:
+reserve 0-3, foundation 4-7, tableau 8-15. Moves are (from, to, count) and move
+as many cards as Slot.receive_from does under the supermove limit of freecell.Game.click,
+so solution lines can be played through freecell.Game.move.
+
+Rule dependent functions take the Rules to play by, standard FreeCell by default ;
+see variants for others.
+"""
+import heapq
+from collections import namedtuple
+from itertools import count
+from time import perf_counter
+
+reserve, foundation, tableau = range(0, 4), range(4, 8), range(8, 16)
+
+Rules = namedtuple('Rules', ['reserve', 'foundation', 'tableau', 'builds', 'empty', 'supermove', 'is_safe'])
+# reserve, foundation, tableau -> slot ranges
+# builds(card, below) -> whether card id builds on card id below in the tableau
+# empty -> cards an empty cascade accepts: 'any' or 'king'
+# supermove(empty cells, empty cascades) -> max cards moved at once
+# is_safe(heights, n, suit) -> whether no card left out of foundations can build on card number n of suit,
+# heights being the foundation height of each suit
+
+
+def number(card):
+    return card % 13 + 1
+
+
+def color(card):
+    return card // 13 % 2
+
+
+def alternate(card, below):
+    """Whether card builds on below: descending, alternate colors"""
+    return number(card) == number(below) - 1 and color(card) != color(below)
+
+
+def freecell_supermove(cells, cascades):
+    return (1 + cells) * (1 + cascades)
+
+
+def is_safe(heights, n, suit):
+    """Whether no card left out of foundations can build on card number n of suit"""
+    return n <= 2 or min(heights[s] for s in range(4) if s % 2 != suit % 2) >= n - 1
+
+
+standard = Rules(reserve, foundation, tableau, alternate, 'any', freecell_supermove, is_safe)
+
+
+def position(stacks):
+    """Return position from 16 sequences of card ids"""
+    return tuple(tuple(s) for s in stacks)
+
+
+def deal_position(deal_number):
+    """Return position of numbered deal, dealt as freecell does"""
+    import deck
+    cards = deck.deal(deal_number)
+    return position([[]] * 8 + [cards[k::8] for k in range(8)])
+
+
+def key(pos, rules=standard):
+    """
+    Return canonical key, equal for positions differing only by slot order ;
+    the same bytes as solvecache.canonical under standard rules
+    """
+    heights = [0] * 4
+    for k in rules.foundation:
+        if pos[k]:
+            heights[pos[k][-1] // 13] = pos[k][-1] % 13 + 1
+    cells = sorted(pos[k][-1] if pos[k] else 0xFF for k in rules.reserve)
+    return bytes(heights + cells) + b'\xfe'.join(sorted(bytes(pos[k]) for k in rules.tableau))
+
+
+def score(pos, rules=standard):
+    return sum(len(pos[k]) for k in rules.foundation)
+
+
+def is_won(pos, rules=standard):
+    return score(pos, rules) == 52
+
+
+def limit(pos, rules=standard):
+    """Supermove limit of freecell.Game.click"""
+    return rules.supermove(sum(not pos[k] for k in rules.reserve), sum(not pos[k] for k in rules.tableau))
+
+
+def run_length(stack, rules=standard):
+    """Length of the run at the top of stack, each card building on the one below"""
+    builds = rules.builds
+    n = len(stack)
+    if n == 0:
+        return 0
+    k = 1
+    while k < n and builds(stack[-k], stack[-k - 1]):
+        k += 1
+    return k
+
+
+def foundation_count(pos, f, t, rules=standard):
+    """Number of cards receive_from moves from f to foundation t, 0 if illegal"""
+    src, dst = pos[f], pos[t]
+    if dst:
+        need = dst[-1] + 1
+        if number(dst[-1]) == 13:
+            return 0
+    else:
+        need = None
+    n = len(src)
+    for k in range(1, min(n, limit(pos, rules)) + 1):  # same suit ascending run, bottom to top
+        card = src[-k]
+        if k > 1 and not (src[-k + 1] == card + 1 and number(src[-k + 1]) != 1):
+            return 0
+        if card == need or (need is None and number(card) == 1):
+            return k
+    return 0
+
+
+def moves(pos, symmetric=False, rules=standard):
+    """
+    Return legal moves of position
+    symmetric -> include moves to every empty cell and column, not only the first one
+    """
+    reserve, foundation, tableau, builds = rules.reserve, rules.foundation, rules.tableau, rules.builds
+    resp = []
+    lim = limit(pos, rules)
+    empty_cell = [k for k in reserve if not pos[k]]
+    empty_column = [k for k in tableau if not pos[k]]
+    for f in (*reserve, *tableau):
+        src = pos[f]
+        if not src:
+            continue
+        top = src[-1]
+        for t in foundation:
+            n = foundation_count(pos, f, t, rules)
+            if n:
+                resp.append((f, t, n))
+                break
+        run = min(run_length(src, rules) if f in tableau else 1, lim)
+        for t in tableau:
+            if t == f:
+                continue
+            dst = pos[t]
+            if dst:
+                n = number(dst[-1]) - number(top)
+                if 1 <= n <= run and builds(src[-n], dst[-1]):
+                    resp.append((f, t, n))
+        n = run if rules.empty == 'any' else 14 - number(top)  # cards up to the King
+        if n <= run:
+            for t in (empty_column if symmetric else empty_column[:1]):
+                if t != f:
+                    resp.append((f, t, n))
+        for t in (empty_cell if symmetric else empty_cell[:1]):
+            if t != f:
+                resp.append((f, t, 1))
+    return resp
+
+
+def apply(pos, move):
+    f, t, n = move
+    resp = list(pos)
+    resp[t] = pos[t] + pos[f][-n:]
+    resp[f] = pos[f][:-n]
+    return tuple(resp)
+
+
+def safe_moves(pos, rules=standard):
+    """
+    Apply foundation moves that cannot spoil a win: cards up to number 2, or that
+    no card left out of foundations could build on, see Rules.is_safe
+    Return tuple(position, moves)
+    """
+    foundation, is_safe = rules.foundation, rules.is_safe
+    line = []
+    heights = [0] * 4
+    for k in foundation:
+        if pos[k]:
+            heights[pos[k][-1] // 13] = number(pos[k][-1])
+    changed = True
+    while changed:
+        changed = False
+        for f in (*rules.reserve, *rules.tableau):
+            if not pos[f]:
+                continue
+            card = pos[f][-1]
+            n, suit = number(card), card // 13
+            if heights[suit] != n - 1:
+                continue
+            if not is_safe(heights, n, suit):
+                continue
+            t = next(k for k in foundation if (pos[k] and n > 1 and pos[k][-1] == card - 1) or (not pos[k] and n == 1))
+            pos = apply(pos, (f, t, 1))
+            line.append((f, t, 1))
+            heights[suit] = n
+            changed = True
+    return pos, line
+
+
+def heuristic(pos, rules=standard):
+    """Estimated cost to win: missing foundation cards and cards burying the next ones"""
+    heights = [0] * 4
+    for k in rules.foundation:
+        if pos[k]:
+            heights[pos[k][-1] // 13] = number(pos[k][-1])
+    buried = 0
+    for k in rules.tableau:
+        stack = pos[k]
+        for depth, card in enumerate(stack):
+            if number(card) == heights[card // 13] + 1:
+                buried += len(stack) - depth - 1
+    free = sum(not pos[k] for k in rules.reserve) + 2 * sum(not pos[k] for k in rules.tableau)
+    return 2 * (52 - score(pos, rules)) + buried - free
+
+
+def search(pos, max_nodes=None, deadline=None, dead=None, proven=None, rules=standard):
+    """
+    Best first search for a win from position
+    max_nodes, deadline (perf_counter time) -> budget
+    dead -> set of keys of positions known lost, extended with positions proven lost
+    proven -> list extended with keys of the positions this search proved lost
+    Return tuple(status, line, nodes) where status is 'won' with line the moves to win,
+    'lost' when every reachable position was explored, or 'unknown' when out of budget
+    """
+    pos, line = safe_moves(pos, rules)
+    if is_won(pos, rules):
+        return 'won', line, 0
+    dead = set() if dead is None else dead
+    start = key(pos, rules)
+    if start in dead:
+        return 'lost', None, 0
+    parents = {start: (None, None)}
+    tie = count()
+    queue = [(heuristic(pos, rules), next(tie), pos, start)]
+    nodes = 0
+    while queue:
+        if (max_nodes is not None and nodes >= max_nodes) or (deadline is not None and perf_counter() > deadline):
+            return 'unknown', None, nodes
+        _, _, current, current_key = heapq.heappop(queue)
+        nodes += 1
+        for move in moves(current, False, rules):
+            child, auto = safe_moves(apply(current, move), rules)
+            child_key = key(child, rules)
+            if child_key in parents or child_key in dead:
+                continue
+            parents[child_key] = (current_key, [move] + auto)
+            if is_won(child, rules):
+                return 'won', line + _line(parents, child_key), nodes
+            heapq.heappush(queue, (heuristic(child, rules), next(tie), child, child_key))
+    dead.update(parents)
+    if proven is not None:
+        proven.extend(parents)
+    return 'lost', None, nodes
+
+
+def _line(parents, k):
+    resp = []
+    while True:
+        k, moves = parents[k]
+        if k is None:
+            return resp
+        resp[:0] = moves
+
+
+def main():
+    import replay
+    for deal in range(1, 11):
+        pos = deal_position(deal)
+        start = perf_counter()
+        status, line, nodes = search(pos, deadline=perf_counter() + 10)
+        elapsed = perf_counter() - start
+        if status == 'won':
+            assert replay.verify(deal, line)
+        print(f'deal {deal:>3}: {status} in {0 if line is None else len(line)} moves, {nodes} nodes, {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Spectator server streaming live games to local subscribers.
+
+The server runs an asyncio loop in a background thread, listening on a TCP address
+'host:port' or a Unix socket path. The game publishes from its own thread without
+ever waiting on clients. Messages are JSON lines:
+    {"t": "snapshot", "table": k, "deal": n, "stacks": [16 lists of card ids]}
+    {"t": "move", "table": k, "move": [from, to, count]}
+Slots are ordered as freecell.Game.slots. A joining client first receives a snapshot of
+every table, then moves. A client falling more than max_queue messages behind has
+its queue dropped and gets fresh snapshots instead once it catches up.
+
+Usage:
+    spectate.py watch ADDRESS                 print messages of a running game
+    spectate.py bench [--clients N]           fan-out benchmark
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from time import perf_counter
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+async def open_connection(address):
+    """address -> 'host:port' or Unix socket path"""
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(address)
+
+
+def apply_message(positions, message):
+    """Update positions {table: [16 lists of card ids]} with a message"""
+    if message['t'] == 'snapshot':
+        positions[message['table']] = [list(s) for s in message['stacks']]
+    else:
+        stacks = positions[message['table']]
+        f, t, n = message['move']
+        stacks[t].extend(stacks[f][-n:])
+        del stacks[f][-n:]
+
+
+class Client(object):
+    """Subscriber connection ; lines queued by the server loop, written by its own task"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = deque()
+        self.resync = True  # send snapshots before queued lines
+        self.ready = asyncio.Event()
+        self.ready.set()
+        self.task = asyncio.current_task()
+        self.closed = False
+
+
+class SpectatorServer(object):
+    """
+    address -> 'host:port' or Unix socket path ; port 0 picks a free port, see address
+    max_queue -> queued messages per client before it is resynchronised by snapshots
+    close_timeout -> seconds left to clients to flush on close, before their connection is aborted
+    """
+
+    def __init__(self, address, max_queue=1024, close_timeout=1.0):
+        self.address = address
+        self.max_queue = max_queue
+        self.close_timeout = close_timeout
+        self.positions = {}  # table -> stacks, as last published
+        self.deals = {}  # table -> deal number
+        self.clients = set()
+        self.dropped = 0  # client queues dropped for resynchronisation
+        self.loop = None
+        self.server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None  # raised by start when listening failed
+
+    def start(self):
+        """Start serving in a background thread ; return once listening, raises OSError if it cannot"""
+        self._thread = threading.Thread(target=self._run, name='spectate', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        return self
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._listen())
+        except Exception as e:
+            self._error = e
+            loop.close()
+            return
+        finally:
+            self._started.set()
+        self.loop = loop
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _listen(self):
+        if ':' in self.address:
+            host, port = self.address.rsplit(':', 1)
+            self.server = await asyncio.start_server(self._serve, host, int(port))
+            self.address = '%s:%d' % self.server.sockets[0].getsockname()[:2]
+        else:
+            self.server = await asyncio.start_unix_server(self._serve, self.address)
+
+    def close(self):
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self._close()))
+        self._thread.join()
+
+    async def _close(self):
+        self.server.close()
+        clients = list(self.clients)
+        for client in clients:
+            client.closed = True
+            client.ready.set()
+        tasks = [client.task for client in clients]
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.close_timeout)
+            for client in clients:
+                if client.task in pending:
+                    client.writer.transport.abort()  # not reading, blocked in drain
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+        if ':' not in self.address:
+            os.remove(self.address)
+        self.loop.stop()
+
+    # publishing, from any thread
+
+    def snapshot(self, table, deal_number, stacks):
+        stacks = [list(s) for s in stacks]
+        self.loop.call_soon_threadsafe(self._snapshot, table, deal_number, stacks)
+
+    def move(self, table, move):
+        self.loop.call_soon_threadsafe(self._move, table, tuple(move))
+
+    # server loop
+
+    def _snapshot(self, table, deal_number, stacks):
+        self.positions[table] = stacks
+        self.deals[table] = deal_number
+        self._broadcast(encode(self._snapshot_message(table)))
+
+    def _snapshot_message(self, table):
+        return {'t': 'snapshot', 'table': table, 'deal': self.deals[table], 'stacks': self.positions[table]}
+
+    def _move(self, table, move):
+        apply_message(self.positions, {'t': 'move', 'table': table, 'move': move})
+        self._broadcast(encode({'t': 'move', 'table': table, 'move': move}))
+
+    def _broadcast(self, line):
+        for client in self.clients:
+            if client.resync:
+                continue  # snapshots will carry this change
+            if len(client.queue) >= self.max_queue:
+                client.queue.clear()
+                client.resync = True
+                self.dropped += 1
+            else:
+                client.queue.append(line)
+            client.ready.set()
+
+    async def _serve(self, reader, writer):
+        client = Client(writer)
+        self.clients.add(client)
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                if client.closed:
+                    break
+                if client.resync:
+                    client.resync = False
+                    data = b''.join(encode(self._snapshot_message(table)) for table in sorted(self.positions))
+                else:
+                    data = b''.join(client.queue)
+                    client.queue.clear()
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+
+class Spectator(object):
+    """
+    Local subscriber keeping the positions of the tables it watches
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.deals = {}
+        self.messages = 0
+        self.reader = self.writer = None
+
+    async def connect(self, address):
+        self.reader, self.writer = await open_connection(address)
+        return self
+
+    async def run(self, on_message=None):
+        """Apply messages until the server closes the connection"""
+        async for line in self.reader:
+            message = json.loads(line)
+            if message['t'] == 'snapshot':
+                self.deals[message['table']] = message['deal']
+            apply_message(self.positions, message)
+            self.messages += 1
+            if on_message is not None:
+                on_message(message)
+
+    def close(self):
+        self.writer.close()
+
+
+async def watch(address):
+    spectator = await Spectator().connect(address)
+    await spectator.run(on_message=print)
+
+
+def bench(clients, games=20, address='127.0.0.1:0'):
+    """
+    Publish solver lines of numbered deals to many local spectators
+    Return tuple(messages sent per client, seconds)
+    """
+    import solver
+    lines = []
+    for deal in range(1, 4):
+        stacks = solver.deal_position(deal)
+        status, line, nodes = solver.search(stacks, deadline=perf_counter() + 10)
+        lines.append((deal, stacks, line))
+    server = SpectatorServer(address).start()
+    server.snapshot(0, lines[0][0], lines[0][1])
+
+    async def run():
+        spectators = [await Spectator().connect(server.address) for _ in range(clients)]
+        tasks = [asyncio.ensure_future(s.run()) for s in spectators]
+        while any(s.messages < 1 for s in spectators):
+            await asyncio.sleep(0.01)
+        start = perf_counter()
+        sent = 0
+        for k in range(games):
+            deal, stacks, line = lines[k % len(lines)]
+            server.snapshot(0, deal, stacks)
+            for move in line:
+                server.move(0, move)
+            sent += 1 + len(line)
+        final = stacks
+        for move in line:
+            final = solver.apply(final, move)
+        final = [list(s) for s in final]
+        while any(s.positions.get(0) != final for s in spectators):
+            await asyncio.sleep(0.001)
+        elapsed = perf_counter() - start
+        for s in spectators:
+            s.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return sent, elapsed
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.close()
+        if server.dropped:
+            print(f'{server.dropped} client queues dropped and resynchronised')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spectate live FreeCell games')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('watch')
+    p.add_argument('address', help="'host:port' or Unix socket path given to freecell.py --spectate")
+    p = commands.add_parser('bench')
+    p.add_argument('--clients', type=int, default=300)
+    p.add_argument('--games', type=int, default=20)
+    args = parser.parse_args()
+    if args.command == 'watch':
+        try:
+            asyncio.run(watch(args.address))
+        except KeyboardInterrupt:
+            pass
+    else:
+        sent, elapsed = bench(args.clients, args.games)
+        print(f'{sent} messages to {args.clients} clients in {elapsed:.2f}s '
+              f'({sent * args.clients / elapsed:.0f} deliveries/s)')
+
+
+if __name__ == '__main__':
+    main()
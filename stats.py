@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Local game statistics in SQLite.
+
+Every finished or abandoned game is a row of games. Per deal aggregates and the
+overall summary, win streaks included, are kept up to date as rows are written,
+so queries read a few indexed rows whatever the number of games.
+Rows are written in batches by a background thread ; see Writer.
+
+Usage:
+    stats.py [--db PATH] summary
+    stats.py [--db PATH] deal N
+    stats.py [--db PATH] hardest [--min-games N] [--top N]
+    stats.py [--db PATH] fastest [--top N]
+    stats.py bench N                       time queries on N synthetic games
+"""
+import argparse
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from time import perf_counter
+
+Record = namedtuple('Record', ['deal', 'moves', 'undos', 'duration', 'won', 'finished'])
+Summary = namedtuple('Summary', ['games', 'wins', 'streak', 'best_streak'])
+
+schema = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    deal INTEGER,
+    moves INTEGER NOT NULL,
+    undos INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    won INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_deal ON games(deal, won);
+CREATE INDEX IF NOT EXISTS games_fastest ON games(won, duration);
+CREATE TABLE IF NOT EXISTS deals (
+    deal INTEGER PRIMARY KEY,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    best REAL
+);
+CREATE INDEX IF NOT EXISTS deals_rate ON deals(CAST(wins AS REAL) / games, games);
+CREATE TABLE IF NOT EXISTS summary (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    best_streak INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO summary VALUES (1, 0, 0, 0, 0);
+'''
+
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')  # readers do not wait on the writer
+    db.executescript(schema)
+    return db
+
+
+def write(db, records):
+    """Insert records and update aggregates in one transaction"""
+    with db:
+        db.execute('BEGIN IMMEDIATE')  # other processes sharing the file wait until the summary is written back
+        games, wins, streak, best_streak = db.execute('SELECT games, wins, streak, best_streak FROM summary').fetchone()
+        for r in records:
+            games += 1
+            wins += bool(r.won)
+            streak = streak + 1 if r.won else 0
+            best_streak = max(best_streak, streak)
+        db.executemany('INSERT INTO games (deal, moves, undos, duration, won, finished) VALUES (?, ?, ?, ?, ?, ?)',
+                       [(r.deal, r.moves, r.undos, r.duration, int(bool(r.won)), r.finished) for r in records])
+        db.executemany('''INSERT INTO deals VALUES (?, 1, ?, ?) ON CONFLICT(deal) DO UPDATE SET
+                              games = games + 1, wins = wins + excluded.wins,
+                              best = CASE WHEN excluded.best IS NULL THEN best WHEN best IS NULL THEN excluded.best
+                                          ELSE min(best, excluded.best) END''',
+                       [(r.deal, int(bool(r.won)), r.duration if r.won else None) for r in records if r.deal is not None])
+        db.execute('UPDATE summary SET games = ?, wins = ?, streak = ?, best_streak = ?',
+                   (games, wins, streak, best_streak))
+
+
+class Writer(object):
+    """
+    Background thread writing records in batches ; record never waits on disk
+    """
+
+    def __init__(self, path, batch=256, interval=1.0):
+        self.path = path
+        self.batch = batch
+        self.interval = interval  # seconds a record may wait for a batch
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='stats', daemon=True)
+        self._thread.start()
+
+    def record(self, deal, moves, undos, duration, won):
+        self.queue.put(Record(deal, moves, undos, duration, won, time.time()))
+
+    def close(self):
+        """Write pending records and stop"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        db = connect(self.path)
+        try:
+            running = True
+            while running:
+                records = [self.queue.get()]
+                deadline = perf_counter() + self.interval
+                while len(records) < self.batch and records[-1] is not None:
+                    try:
+                        records.append(self.queue.get(timeout=max(0, deadline - perf_counter())))
+                    except queue.Empty:
+                        break
+                if records[-1] is None:
+                    running = False
+                    records.pop()
+                if records:
+                    write(db, records)
+        finally:
+            db.close()
+
+
+def summary(db):
+    return Summary(*db.execute('SELECT games, wins, streak, best_streak FROM summary').fetchone())
+
+
+def deal(db, number):
+    """Return tuple(games, wins, best winning duration) of a deal"""
+    return db.execute('SELECT games, wins, best FROM deals WHERE deal = ?', (number,)).fetchone() or (0, 0, None)
+
+
+def hardest(db, min_games=3, top=10):
+    """Return [(deal, games, wins)] of deals with the lowest win rate"""
+    return db.execute('''SELECT deal, games, wins FROM deals INDEXED BY deals_rate WHERE games >= ?
+                         ORDER BY CAST(wins AS REAL) / games, games LIMIT ?''', (min_games, top)).fetchall()
+
+
+def fastest(db, top=10):
+    """Return [(deal, duration, moves, undos)] of the fastest won games"""
+    return db.execute('''SELECT deal, duration, moves, undos FROM games WHERE won = 1
+                         ORDER BY duration LIMIT ?''', (top,)).fetchall()
+
+
+def lines(db, top=5):
+    """Return summary text lines, as shown by the stats screen"""
+    s = summary(db)
+    resp = [f'{s.games} games, {s.wins} won ({s.wins / s.games if s.games else 0:.1%})',
+            f'streak {s.streak}, best streak {s.best_streak}',
+            'fastest wins:']
+    resp += [f'  deal {d}: {duration:.1f}s, {moves} moves, {undos} undos' for d, duration, moves, undos in fastest(db, top)]
+    return resp
+
+
+def bench(n):
+    """Write n synthetic games to a temporary database and time the queries"""
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        start = perf_counter()
+        writer = Writer(path, batch=4096)
+        for _ in range(n):
+            won = rng.random() < 0.7
+            writer.record(rng.randint(1, 32000), rng.randint(50, 200), rng.randint(0, 20), rng.uniform(60, 900), won)
+        queued = perf_counter() - start
+        writer.close()
+        print(f'{n} games queued in {queued:.2f}s, written in {perf_counter() - start:.2f}s')
+        db = connect(path)
+        for name, query in [('summary', lambda: summary(db)), ('deal', lambda: deal(db, 617)),
+                            ('hardest', lambda: hardest(db)), ('fastest', lambda: fastest(db))]:
+            start = perf_counter()
+            query()
+            print(f'{name:>8}: {(perf_counter() - start) * 1000:.2f}ms')
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FreeCell game statistics')
+    parser.add_argument('--db', default='freecell.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('summary')
+    p = commands.add_parser('deal')
+    p.add_argument('number', type=int)
+    p = commands.add_parser('hardest')
+    p.add_argument('--min-games', type=int, default=3)
+    p.add_argument('--top', type=int, default=10)
+    p = commands.add_parser('fastest')
+    p.add_argument('--top', type=int, default=10)
+    p = commands.add_parser('bench')
+    p.add_argument('n', type=int)
+    args = parser.parse_args()
+    if args.command == 'bench':
+        bench(args.n)
+        return
+    db = connect(args.db)
+    if args.command == 'summary':
+        print('\n'.join(lines(db)))
+    elif args.command == 'deal':
+        games, wins, best = deal(db, args.number)
+        print(f'deal {args.number}: {games} games, {wins} won' + (f', best {best:.1f}s' if best is not None else ''))
+    elif args.command == 'hardest':
+        for number, games, wins in hardest(db, args.min_games, args.top):
+            print(f'deal {number}: {wins}/{games} won ({wins / games:.0%})')
+    else:
+        for number, duration, moves, undos in fastest(db, args.top):
+            print(f'deal {number}: {duration:.1f}s, {moves} moves, {undos} undos')
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Image based card themes.
+
+A theme is either a directory holding one image per card, named <suit>-<number>.<ext>
+with suit names of deck.Suits.names and numbers 1 to 13 (eg. heart-12.png), or a
+single sprite sheet of 13 columns (Ace to King) and 4 rows in deck.Suits.suits order.
+Cards missing from a directory, or whose image fails to decode, keep the procedural drawing.
+
+Images are decoded by a shared thread pool as soon as the theme is created, then
+scaled once per card size ; recently used sizes are kept in a least recently used cache.
+"""
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import pygame
+from pygame.constants import SRCALPHA
+from deck import Suits, card_id
+
+extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tga', '.webp')
+_executor = None
+
+
+def executor():
+    """Return the shared decoding thread pool"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(thread_name_prefix='theme')
+    return _executor
+
+
+def decode(path):
+    """Return image at path as a 32 bits surface, independent of any display"""
+    image = pygame.image.load(path)
+    resp = pygame.Surface(image.get_size(), SRCALPHA, 32)
+    resp.blit(image, (0, 0))
+    return resp
+
+
+def decode_sheet(path):
+    """Return {card id: surface} cut from a 13x4 sprite sheet"""
+    sheet = decode(path)
+    w, h = sheet.get_width() // 13, sheet.get_height() // 4
+    return {card_id(number, suit): sheet.subsurface(pygame.Rect((number - 1) * w, row * h, w, h)).copy()
+            for row, suit in enumerate(Suits.suits) for number in range(1, 14)}
+
+
+def card_files(directory):
+    """Return {card id: path} of card images in directory"""
+    resp = {}
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        suit, _, number = stem.partition('-')
+        if ext.lower() in extensions and suit in Suits.names and number.isdigit() and 1 <= int(number) <= 13:
+            resp[card_id(int(number), Suits.suits[Suits.names.index(suit)])] = os.path.join(directory, name)
+    return resp
+
+
+class Theme(object):
+    """
+    path -> card images directory or sprite sheet ; decoding starts right away
+    sizes -> number of card sizes kept scaled
+    Raises ValueError if path is neither
+    """
+
+    def __init__(self, path, sizes=4):
+        if not os.path.exists(path):
+            raise ValueError(f'no card images directory or sprite sheet at {path}')
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        self.sizes = sizes
+        self._scaled = OrderedDict()  # size -> {card id: surface}
+        self._lock = Lock()
+        if os.path.isdir(path):
+            self._pending = {k: (p, executor().submit(decode, p)) for k, p in card_files(path).items()}
+            self._sheet = None
+        else:
+            self._pending = {}
+            self._sheet = executor().submit(decode_sheet, path)
+        self._images = None
+
+    @property
+    def images(self):
+        """{card id: decoded surface} ; waits for decoding to end, leaving out images that fail"""
+        if self._images is None:
+            images = {}
+            if self._sheet is not None:
+                try:
+                    images = self._sheet.result()
+                except (pygame.error, OSError, ValueError) as e:
+                    print(f'theme {self.name}: cannot decode {self.path}: {e}')
+            for k, (path, future) in self._pending.items():
+                try:
+                    images[k] = future.result()
+                except (pygame.error, OSError, ValueError) as e:
+                    print(f'theme {self.name}: cannot decode {path}: {e}')
+            self._images = images
+        return self._images
+
+    def __contains__(self, card_id):
+        return card_id in self.images
+
+    def face(self, card_id, size):
+        """Return card image scaled to size, scaling all the cards of that size once"""
+        with self._lock:
+            try:
+                faces = self._scaled[size]
+            except KeyError:
+                faces = self._scaled[size] = {k: pygame.transform.smoothscale(image, size)
+                                              for k, image in self.images.items()}
+                while len(self._scaled) > self.sizes:
+                    self._scaled.popitem(last=False)
+            else:
+                self._scaled.move_to_end(size)
+            return faces[card_id]
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+FreeCell variants: cell and cascade counts, building rule, empty column rule and
+supermove limit.
+
+compile() specialises a variant once: a TableauSlot subclass whose put_single only
+runs the checks of that variant, and the solver.Rules the solver functions play it by.
+Standard FreeCell keeps board.TableauSlot and solver.standard.
+
+Slots are ordered as in freecell: cells, then the 4 foundations, then cascades.
+
+Usage:
+    variants.py bench [--deals N]          move generation and solving throughput per variant
+"""
+import argparse
+from collections import namedtuple
+from time import perf_counter
+import solver
+from board import TableauSlot
+
+Variant = namedtuple('Variant', ['name', 'cells', 'cascades', 'build', 'empty', 'supermove', 'dealt_cells'])
+# build -> 'alternate' colors, same 'suit' or 'any' suit, descending
+# empty -> cards an empty cascade accepts: 'any' or 'king'
+# supermove -> cards moved at once: 'freecell' (1 + cells) * (1 + cascades) empty, 'cells' 1 + empty cells, 'none' 1
+# dealt_cells -> cells receiving the last cards of the deal
+
+freecell = Variant('FreeCell', 4, 8, 'alternate', 'any', 'freecell', 0)
+bakers_game = Variant("Baker's Game", 4, 8, 'suit', 'any', 'freecell', 0)
+eight_off = Variant('Eight Off', 8, 8, 'suit', 'king', 'cells', 4)
+variants = {'freecell': freecell, 'bakers': bakers_game, 'eightoff': eight_off}
+
+Rules = namedtuple('Rules', ['variant', 'tableau_slot', 'supermove', 'solver'])
+# supermove(empty cells, empty cascades) -> max cards moved at once
+# solver -> solver.Rules of the variant
+
+card_builds = {  # card, card below -> bool
+    'alternate': lambda card, below: card.number == below.number - 1 and card.color != below.color,
+    'suit': lambda card, below: card.id == below.id - 1 and below.number != 1,
+    'any': lambda card, below: card.number == below.number - 1,
+}
+id_builds = {  # card id, card id below -> bool
+    'alternate': solver.alternate,
+    'suit': lambda card, below: card == below - 1 and below % 13 != 0,
+    'any': lambda card, below: card % 13 == below % 13 - 1,
+}
+supermoves = {
+    'freecell': solver.freecell_supermove,
+    'cells': lambda cells, cascades: 1 + cells,
+    'none': lambda cells, cascades: 1,
+}
+safety = {  # foundation heights, card number, suit -> whether no card left out could build on it ; see solver.is_safe
+    'alternate': solver.is_safe,
+    'suit': lambda heights, n, suit: True,  # only the card below in the same suit could, and it is home already
+    'any': lambda heights, n, suit: n <= 2 or min(heights) >= n - 1,
+}
+_compiled = {}
+
+
+def custom(base=freecell, **kwargs):
+    """Return base variant with fields replaced, eg. custom(cells=2, cascades=10) ; raises ValueError, see compile"""
+    resp = base._replace(**kwargs)
+    changes = ', '.join(f'{k} {v}' for k, v in kwargs.items() if getattr(base, k) != v)
+    resp = resp._replace(name=f'{base.name} ({changes})') if changes else resp
+    compile(resp)
+    return resp
+
+
+def compile(variant):
+    """Return Rules of variant, built once ; raises ValueError if the variant cannot be dealt or played"""
+    if variant.build not in card_builds or variant.empty not in ('any', 'king') or variant.supermove not in supermoves:
+        raise ValueError(f'unknown rules in {variant}')
+    if variant.cascades < 1 or variant.cells < 0:
+        raise ValueError(f'{variant.name} needs at least 1 cascade and 0 cells, got {variant.cascades} and {variant.cells}')
+    if not 0 <= variant.dealt_cells <= variant.cells:
+        raise ValueError(f'{variant.name} deals {variant.dealt_cells} cards to {variant.cells} cells')
+    try:
+        return _compiled[variant]
+    except KeyError:
+        pass
+    if variant[1:] == freecell[1:]:
+        resp = Rules(variant, TableauSlot, supermoves['freecell'], solver.standard)
+    else:
+        resp = Rules(variant, tableau_slot(variant), supermoves[variant.supermove], solver_rules(variant))
+    _compiled[variant] = resp
+    return resp
+
+
+def tableau_slot(variant):
+    """Return TableauSlot subclass checking the variant rules"""
+    builds = card_builds[variant.build]
+    if variant.empty == 'king':
+        def put_single(self, card):
+            if self.stack:
+                if not builds(card, self.stack[-1]):
+                    raise ValueError(f'{card} cannot stack on {self.stack[-1]}')
+            elif card.number != 13:
+                raise ValueError(f'Empty cascade only accepts a King, got {card}')
+            self.stack.append(card)
+    else:
+        def put_single(self, card):
+            if self.stack and not builds(card, self.stack[-1]):
+                raise ValueError(f'{card} cannot stack on {self.stack[-1]}')
+            self.stack.append(card)
+    name = ''.join(c for c in variant.name.title() if c.isalnum()) + 'TableauSlot'
+    return type(name, (TableauSlot,), {'put_single': put_single, '__doc__': f'TableauSlot of {variant.name}'})
+
+
+def solver_rules(variant):
+    """Return solver.Rules of variant"""
+    c = variant.cells
+    reserve, foundation, tableau = range(0, c), range(c, c + 4), range(c + 4, c + 4 + variant.cascades)
+    return solver.Rules(reserve, foundation, tableau, id_builds[variant.build], variant.empty,
+                        supermoves[variant.supermove], safety[variant.build])
+
+
+def deal(variant, card_ids):
+    """Return lists of card ids dealt to cells and cascades"""
+    card_ids = list(card_ids)
+    cut = len(card_ids) - variant.dealt_cells
+    cells = [[c] for c in card_ids[cut:]] + [[] for _ in range(variant.cells - variant.dealt_cells)]
+    cascades = [card_ids[k:cut:variant.cascades] for k in range(variant.cascades)]
+    return cells, cascades
+
+
+def initial_position(variant, card_ids):
+    cells, cascades = deal(variant, card_ids)
+    return solver.position(cells + [[]] * 4 + cascades)
+
+
+def bench(deals=20, budget=2.0):
+    """Print move generation and solving throughput of each variant on numbered deals"""
+    import deck
+    for v in variants.values():
+        rules = compile(v).solver
+        positions = [initial_position(v, deck.deal(n)) for n in range(1, deals + 1)]
+        start = perf_counter()
+        for pos in positions * 50:
+            solver.moves(pos, rules=rules)
+        move_rate = len(positions) * 50 / (perf_counter() - start)
+        won = nodes = 0
+        start = perf_counter()
+        for pos in positions:
+            status, line, n = solver.search(pos, deadline=perf_counter() + budget, rules=rules)
+            won += status == 'won'
+            nodes += n
+        elapsed = perf_counter() - start
+        print(f'{v.name:>14}: {move_rate:>8.0f} positions/s move generation, '
+              f'{won}/{deals} solved, {nodes / elapsed:>6.0f} nodes/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FreeCell variants')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('bench')
+    p.add_argument('--deals', type=int, default=20)
+    p.add_argument('--budget', type=float, default=2.0, help='seconds of search per deal')
+    args = parser.parse_args()
+    bench(args.deals, args.budget)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Batched multi-board FreeCell simulator on NumPy arrays, for agent training.
+
+N boards are held as stacks (N, 16, depth) of card ids (-1 if none) and lengths (N, 16),
+slots indexed as freecell.Game.slots: reserve 0-3, foundation 4-7, tableau 8-15.
+An action is from_slot * 16 + to_slot ; it moves as many cards as Slot.receive_from would
+with the supermove limit of freecell.Game.click, then optionally pushes tableau tops to the
+foundation in a single pass as freecell.push_to_foundation does.
+"""
+import numpy as np
+from time import perf_counter
+import deck
+
+depth = 20  # longest tableau: 7 dealt cards and a run from K to 2
+n_actions = 16 * 16
+reserve, foundation, tableau = slice(0, 4), slice(4, 8), slice(8, 16)
+
+# card tables indexed by card id, id -1 (no card) wraps to the sentinel last item
+number = np.array([c.number for c in deck.cards] + [0], dtype=np.int8)
+color = np.array([c.color for c in deck.cards] + [-1], dtype=np.int8)
+ms_to_id = np.array([deck.card_id(c // 4 + 1, deck.ms_suits[c % 4]) for c in range(52)], dtype=np.int8)
+
+
+def deal_batch(deal_numbers):
+    """
+    Return card ids (N, 52) in dealing order for each numbered deal ; vectorized deck.deal
+    """
+    seeds = np.asarray(deal_numbers, dtype=np.int64).copy()
+    n = len(seeds)
+    rows = np.arange(n)
+    cards = np.tile(np.arange(51, -1, -1, dtype=np.int8), (n, 1))
+    for i in range(52):
+        seeds = (seeds * 214013 + 2531011) & 0x7FFFFFFF
+        j = 51 - (seeds >> 16) % (52 - i)
+        picked = cards[rows, j]
+        cards[rows, j] = cards[:, i]
+        cards[:, i] = picked
+    return ms_to_id[cards.astype(np.intp)]
+
+
+class VecBoards(object):
+    """
+    N independent boards stepped together
+    """
+
+    def __init__(self, deal_numbers, auto_push=True):
+        self.auto_push = auto_push
+        self.reset(deal_numbers)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def reset(self, deal_numbers):
+        deal = deal_batch(deal_numbers)
+        n = len(deal)
+        self.rows = np.arange(n)
+        self.stacks = np.full((n, 16, depth), -1, dtype=np.int8)
+        self.lengths = np.zeros((n, 16), dtype=np.int8)
+        for k in range(52):  # deal round robin to tableau
+            column, row = 8 + k % 8, k // 8
+            self.stacks[:, column, row] = deal[:, k]
+        self.lengths[:, tableau] = [7] * 4 + [6] * 4
+        self._counts = None
+
+    def tops(self):
+        """Return top card ids (N, 16), -1 for empty slots"""
+        top = self.stacks[self.rows[:, None], np.arange(16), np.maximum(self.lengths - 1, 0)]
+        return np.where(self.lengths > 0, top, -1)
+
+    def _top(self, rows, slot):
+        """Return top card ids of slot for rows, -1 if empty"""
+        length = self.lengths[rows, slot]
+        return np.where(length > 0, self.stacks[rows, slot, np.maximum(length - 1, 0)], -1)
+
+    def _runs(self):
+        """
+        Return tuple(tableau run, foundation run) lengths (N, 16) at the top of each slot:
+        alternate colors descending run, and same suit ascending run (bottom to top)
+        """
+        lengths = self.lengths.astype(np.intp)
+        idx = lengths - 1
+        upper = np.take_along_axis(self.stacks, np.maximum(idx, 0)[..., None], axis=2)[..., 0]
+        run = (lengths > 0).astype(np.int8)
+        asc = run.copy()
+        run_ok = run.astype(bool)
+        asc_ok = run_ok.copy()
+        for d in range(1, int(lengths.max(initial=0))):
+            below = idx - d
+            lower = np.take_along_axis(self.stacks, np.maximum(below, 0)[..., None], axis=2)[..., 0]
+            exists = below >= 0
+            run_ok &= exists & (number[lower] == number[upper] + 1) & (color[lower] != color[upper])
+            asc_ok &= exists & (lower == upper - 1) & (number[upper] != 1)
+            if not (run_ok.any() or asc_ok.any()):
+                break
+            run += run_ok
+            asc += asc_ok
+            upper = lower
+        return run, asc
+
+    def counts(self):
+        """
+        Return number of cards each action moves (N, 16, 16), 0 when illegal
+        """
+        if self._counts is not None:
+            return self._counts
+        n = len(self)
+        top = self.tops()
+        run, asc = self._runs()
+        limit = ((1 + (self.lengths[:, tableau] == 0).sum(1)) * (1 + (self.lengths[:, reserve] == 0).sum(1)))
+        limit = limit.astype(np.int16)[:, None, None]
+        counts = np.zeros((n, 16, 16), dtype=np.int16)
+        src = top[:, :, None].astype(np.intp)  # (N, 16 from, 1)
+        run = run[:, :, None].astype(np.int16)
+        asc = asc[:, :, None].astype(np.int16)
+        valid = src >= 0
+        valid[:, foundation] = False  # foundation cards cannot be selected
+        # to tableau
+        dst = top[:, None, tableau].astype(np.intp)  # (N, 1, 8 to)
+        k = number[dst].astype(np.int16) - number[src]
+        parity = (color[src] + (k - 1)) % 2
+        stack_on = (dst >= 0) & (k >= 1) & (k <= np.minimum(run, limit)) & (parity != color[dst])
+        on_empty = dst < 0
+        counts[:, :, tableau] = np.where(valid & stack_on, k, 0) + np.where(valid & on_empty, np.minimum(run, limit), 0)
+        # to reserve
+        counts[:, :, reserve] = valid & (self.lengths[:, None, reserve] == 0)
+        # to foundation
+        dst = top[:, None, foundation].astype(np.int16)
+        src16 = src.astype(np.int16)
+        bottom = src16 - asc + 1
+        need = np.where(dst >= 0, dst + 1, bottom)
+        fits = np.where(dst >= 0, number[dst.astype(np.intp)] < 13, number[np.maximum(bottom, 0).astype(np.intp)] == 1)
+        k = src16 - need + 1
+        counts[:, :, foundation] = np.where(valid & fits & (need >= bottom) & (k >= 1) & (k <= np.minimum(asc, limit)), k, 0)
+        counts[:, np.arange(16), np.arange(16)] = 0
+        self._counts = counts
+        return counts
+
+    def legal_moves(self):
+        """Return legal action mask (N, 256)"""
+        return self.counts().reshape(len(self), n_actions) > 0
+
+    def _move(self, rows, f, t, k):
+        lf = self.lengths[rows, f].astype(np.intp)
+        lt = self.lengths[rows, t].astype(np.intp)
+        for d in range(int(k.max(initial=0))):
+            m = d < k
+            r, ff, tt = rows[m], f[m], t[m]
+            pos = lf[m] - k[m] + d
+            self.stacks[r, tt, lt[m] + d] = self.stacks[r, ff, pos]
+            self.stacks[r, ff, pos] = -1
+        self.lengths[rows, f] -= k.astype(np.int8)
+        self.lengths[rows, t] += k.astype(np.int8)
+        self._counts = None
+
+    def push_to_foundation(self):
+        """Single pass of one card moves from each tableau to each foundation"""
+        top = self.tops().astype(np.intp)
+        for tab in range(8, 16):
+            for fnd in range(4, 8):
+                src, dst = top[:, tab], top[:, fnd]
+                ok = (src >= 0) & np.where(dst >= 0, (src == dst + 1) & (number[src] != 1), number[src] == 1)
+                rows = self.rows[ok]
+                if len(rows):
+                    ones = np.ones(len(rows), dtype=np.intp)
+                    self._move(rows, tab * ones, fnd * ones, ones)
+                    top[rows, fnd] = src[rows]
+                    top[rows, tab] = self._top(rows, tab)
+
+    def step(self, actions):
+        """
+        Apply one action per board ; illegal actions leave their board untouched
+        Return tuple(cards moved (N,), won (N,))
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        f, t = actions // 16, actions % 16
+        k = self.counts()[self.rows, f, t].astype(np.intp)
+        moved = k > 0
+        self._move(self.rows[moved], f[moved], t[moved], k[moved])
+        if self.auto_push:
+            self.push_to_foundation()
+        return k, self.won()
+
+    def won(self):
+        return self.lengths[:, foundation].sum(1) == 52
+
+
+def random_actions(mask, rng):
+    """Pick a uniformly random legal action per board, 0 (no-op) if none"""
+    scores = rng.random(mask.shape) * mask
+    return scores.argmax(1)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for n in [1000, 10000, 50000]:
+        boards = VecBoards(np.arange(1, n + 1))
+        steps = 50
+        start = perf_counter()
+        for _ in range(steps):
+            boards.step(random_actions(boards.legal_moves(), rng))
+        elapsed = perf_counter() - start
+        print(f'{n:>6} boards: {n * steps / elapsed:>10.0f} board steps/s')
+
+
+if __name__ == '__main__':
+    main()